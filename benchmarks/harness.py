@@ -0,0 +1,163 @@
+"""Boot the user, inventory and order services in one process, for benchmarks.
+
+Every service is a top-level `app` package, so they can't simply be imported side by side:
+load_service() imports one service's app.main, keeps its modules and removes them from
+sys.modules again before the next one is loaded. The services also register the same metric
+names, so each service's Prometheus collectors are unregistered right after its import
+(the metrics keep working, they just aren't exported).
+
+    async with Stack(database="sqlite") as stack:
+        response = await stack.clients["inventory"].get("/items/")
+"""
+import asyncio
+import importlib
+import os
+import sys
+import tempfile
+from contextlib import AsyncExitStack
+from dataclasses import dataclass, field
+
+import logging
+
+import httpx
+from prometheus_client import REGISTRY
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Service name -> (directory, env var holding its database URL)
+SERVICES = {
+    "user": ("user_service", "DATABASE_URL"),
+    "inventory": ("inventory_service", "INVENTORY_DATABASE_URL"),
+    "order": ("order_service", "ORDER_DATABASE_URL"),
+}
+
+# SQLite serialises writers: with WAL readers don't block them, and a writer waits this long for the lock
+# instead of failing with "database is locked" under the load test's concurrency
+SQLITE_BUSY_TIMEOUT_MS = 30000
+
+# Read by the services at import time; explicit environment variables win
+DEFAULT_ENV = {
+    "SECRET_KEY": "benchmark-secret",
+    "LOG_LEVEL": "ERROR",
+    "LOG_FILE": "",
+    # Production cost is 12; 4 keeps seeding fast. Set BCRYPT_ROUNDS=12 to measure real logins.
+    "BCRYPT_ROUNDS": "4",
+}
+
+@dataclass
+class Service:
+    name: str
+    app: object
+    modules: dict = field(repr=False)
+
+    def module(self, name: str):
+        """One of the service's own modules, e.g. service.module("app.db.database")"""
+        return self.modules[name]
+
+def load_service(name: str) -> Service:
+    """Import <service>/app/main.py in isolation from the other services"""
+    path = os.path.join(ROOT, SERVICES[name][0])
+    collectors = set(REGISTRY._collector_to_names)
+    modules = {}
+    sys.path.insert(0, path)
+    try:
+        main = importlib.import_module("app.main")
+    finally:
+        sys.path.remove(path)
+        for module_name in list(sys.modules):
+            if module_name == "app" or module_name.startswith("app."):
+                modules[module_name] = sys.modules.pop(module_name)
+        for collector in set(REGISTRY._collector_to_names) - collectors:
+            REGISTRY.unregister(collector)
+    return Service(name, main.app, modules)
+
+def configure_env(database: str, workdir: str, extra: dict | None = None):
+    """Set the services' env: SQLite files in `workdir`, or one shared database URL"""
+    for key, value in DEFAULT_ENV.items():
+        os.environ.setdefault(key, value)
+    for name, (_, env_var) in SERVICES.items():
+        if database == "sqlite":
+            url = f"sqlite+aiosqlite:///{os.path.join(workdir, name)}.db"
+        else:
+            url = database  # table names don't overlap, the services can share a database
+        os.environ[env_var] = url
+    os.environ.update(extra or {})
+
+class Stack:
+    """The three services, their tables freshly created, lifespans running and in-process clients.
+
+    `database` is "sqlite" (a temporary file per service) or an async SQLAlchemy URL such as
+    postgresql+asyncpg://localhost/bench. With stock_events=True inventory's stock events feed
+    order_service's stock projection through an in-process queue.
+    """
+
+    def __init__(self, database: str = "sqlite", stock_events: bool = False, env: dict | None = None):
+        self.database = database
+        self.stock_events = stock_events
+        self.env = dict(env or {})
+        if stock_events:
+            self.env.update({"STOCK_EVENTS_TRANSPORT": "memory", "STOCK_PROJECTION_SOURCE": "memory"})
+        self.services: dict[str, Service] = {}
+        self.clients: dict[str, httpx.AsyncClient] = {}
+        self._exit = AsyncExitStack()
+        self._tasks: list[asyncio.Task] = []
+
+    async def __aenter__(self):
+        workdir = self._exit.enter_context(tempfile.TemporaryDirectory(prefix="bench-"))
+        configure_env(self.database, workdir, self.env)
+        for name in SERVICES:
+            self.services[name] = load_service(name)
+        # inventory logs through its own handler; in one process it would also reach the root
+        # logger that order/user configure, and every line would be written twice
+        logging.getLogger("inventory_logger").propagate = False
+        for service in self.services.values():
+            if self.database == "sqlite":
+                self._tune_sqlite(service.module("app.db.database").engine)
+            await self._create_tables(service)
+            # Closed before the temporary directory goes away
+            self._exit.push_async_callback(service.module("app.db.database").engine.dispose)
+        for name, service in self.services.items():
+            self.clients[name] = await self._exit.enter_async_context(httpx.AsyncClient(
+                transport=self._transport(service), base_url=f"http://{name}", timeout=60.0
+            ))
+
+        # order_service reaches the other two in-process; its lifespan keeps clients that already exist
+        order = self.services["order"]
+        await order.module("app.utils.service_clients").start_service_clients({
+            name: self._transport(self.services[name]) for name in ("user", "inventory")
+        })
+        for service in self.services.values():
+            await self._exit.enter_async_context(service.app.router.lifespan_context(service.app))
+        if self.stock_events:
+            queue = self.services["inventory"].module("app.utils.stock_events").transport.subscribe()
+            consume = order.module("app.utils.stock_projection").consume_stock_events
+            self._tasks.append(asyncio.create_task(consume(queue)))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        for task in self._tasks:
+            task.cancel()
+        await self._exit.aclose()
+
+    @staticmethod
+    def _transport(service: Service) -> httpx.ASGITransport:
+        # An unhandled error becomes a 500 response, as behind a real server, instead of being
+        # raised into the caller (for order_service: into its call to inventory)
+        return httpx.ASGITransport(app=service.app, raise_app_exceptions=False)
+
+    @staticmethod
+    def _tune_sqlite(engine):
+        @event.listens_for(engine.sync_engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+            cursor.execute("PRAGMA journal_mode = WAL")
+            cursor.close()
+
+    @staticmethod
+    async def _create_tables(service: Service):
+        database = service.module("app.db.database")
+        async with database.engine.begin() as conn:
+            await conn.run_sync(database.Base.metadata.drop_all)
+            await conn.run_sync(database.Base.metadata.create_all)
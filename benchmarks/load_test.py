@@ -0,0 +1,335 @@
+"""End-to-end load test: user, inventory and order services in one process (see harness.py).
+
+    python benchmarks/load_test.py [--scenarios login_storm,catalog_browse,flash_sale,order_export]
+                                   [--database sqlite|postgresql+asyncpg://...] [--concurrency 50]
+                                   [--output report.json] [--baseline old.json --tolerance 0.15]
+
+Scenarios:
+  login_storm     many users logging in at once (bcrypt + token issue)
+  catalog_browse  catalog pages with cursors, filters and item lookups
+  flash_sale      every user orders one unit of a single hot SKU with limited stock
+  order_export    admin pages through all orders and streams them as NDJSON
+
+The report holds throughput, p50/p95/p99 latency and error rate per endpoint of every scenario.
+With --baseline, endpoints whose p95 grew or throughput dropped by more than --tolerance, or whose
+error rate rose, are listed as regressions and the exit status is 1.
+"""
+import argparse
+import asyncio
+import json
+import math
+import platform
+import random
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+from harness import Stack
+
+CATEGORIES = ["shirts", "trousers", "jackets", "shoes", "hats"]
+
+def percentile(ordered: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct * len(ordered) / 100) - 1))
+    return ordered[rank]
+
+class Recorder:
+    """Latencies and statuses per endpoint label ("GET /items/") of one scenario"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+        self.started = self.finished = 0.0
+
+    async def request(self, client: httpx.AsyncClient, method: str, url: str, label: str,
+                      expected: tuple = (200,), **kwargs) -> httpx.Response | None:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            status = response.status_code
+        except Exception:
+            response, status = None, "exception"
+        self.latencies[label].append(time.perf_counter() - start)
+        self.statuses[label][str(status)] += 1
+        if status not in expected:
+            self.errors[label] += 1
+        return response
+
+    def report(self) -> dict:
+        duration = max(self.finished - self.started, 1e-9)
+        endpoints = {}
+        for label, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            endpoints[label] = {
+                "count": len(ordered),
+                "errors": self.errors[label],
+                "error_rate": round(self.errors[label] / len(ordered), 4),
+                "throughput_rps": round(len(ordered) / duration, 1),
+                "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+                "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+                "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+                "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+                "statuses": dict(self.statuses[label]),
+            }
+        total = sum(len(samples) for samples in self.latencies.values())
+        return {"duration_s": round(duration, 3), "requests": total,
+                "throughput_rps": round(total / duration, 1), "endpoints": endpoints}
+
+async def run_workers(concurrency: int, total: int, job):
+    """Call job(i) for i in range(total), at most `concurrency` at a time"""
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            await job(i)
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, total))]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        # If one job raised, stop its siblings before the stack shuts down underneath them
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+async def measure(job, concurrency: int, total: int) -> Recorder:
+    recorder = Recorder()
+    recorder.started = time.perf_counter()
+    await run_workers(concurrency, total, lambda i: job(recorder, i))
+    recorder.finished = time.perf_counter()
+    return recorder
+
+class Fixture:
+    """Users, an admin and a catalog, created once and shared by the scenarios (not measured)"""
+
+    def __init__(self, stack: Stack, users: int, items: int, concurrency: int):
+        self.stack = stack
+        self.user_count = users
+        self.item_count = items
+        self.concurrency = concurrency
+        self.users: list[dict] = []
+        self.admin: dict = {}
+        self.item_ids: list[int] = []
+
+    async def setup(self):
+        users = self.stack.clients["user"]
+        self.admin = await self._register(users, "admin", "admin")
+        self.users = [None] * self.user_count
+
+        async def register(i):
+            self.users[i] = await self._register(users, f"user{i}", "user")
+
+        await run_workers(self.concurrency, self.user_count, register)
+
+        rng = random.Random(7)
+        inventory = self.stack.clients["inventory"]
+
+        async def create_item(i):
+            response = await inventory.post("/items/", headers=self.admin["headers"], json={
+                "name": f"item-{i:05d}", "category": rng.choice(CATEGORIES),
+                "quantity": rng.randint(100, 1000), "price": round(rng.uniform(5, 200), 2)
+            })
+            response.raise_for_status()
+            return response.json()["id"]
+
+        self.item_ids = [await create_item(i) for i in range(self.item_count)]
+
+    async def _register(self, client: httpx.AsyncClient, name: str, role: str) -> dict:
+        account = {"username": name, "email": f"{name}@bench.example.com", "password": "bench-password", "role": role}
+        response = await client.post("/users/register", json=account)
+        response.raise_for_status()
+        account["token"] = await self.login(client, account)
+        account["headers"] = {"Authorization": f"Bearer {account['token']}"}
+        return account
+
+    @staticmethod
+    async def login(client: httpx.AsyncClient, account: dict) -> str:
+        response = await client.post("/users/login", data={"username": account["email"], "password": account["password"]})
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+async def login_storm(fixture: Fixture, args) -> dict:
+    client = fixture.stack.clients["user"]
+
+    async def job(recorder: Recorder, i: int):
+        account = fixture.users[i % len(fixture.users)]
+        await recorder.request(client, "POST", "/users/login", "POST /users/login",
+                               data={"username": account["email"], "password": account["password"]})
+
+    recorder = await measure(job, args.concurrency, args.requests)
+    return recorder.report()
+
+async def catalog_browse(fixture: Fixture, args) -> dict:
+    client = fixture.stack.clients["inventory"]
+    rng = random.Random(11)
+
+    async def job(recorder: Recorder, i: int):
+        params = {"limit": 50, "sort": rng.choice(["id", "price", "-price", "name"])}
+        if rng.random() < 0.5:
+            params["category"] = rng.choice(CATEGORIES)
+        response = await recorder.request(client, "GET", "/items/", "GET /items/", params=params)
+        cursor = response.headers.get("X-Next-Cursor") if response is not None else None
+        if cursor:
+            await recorder.request(client, "GET", "/items/", "GET /items/?cursor", params={**params, "cursor": cursor})
+        item_id = rng.choice(fixture.item_ids)
+        await recorder.request(client, "GET", f"/items/{item_id}", "GET /items/{item_id}")
+
+    recorder = await measure(job, args.concurrency, args.requests)
+    return recorder.report()
+
+async def flash_sale(fixture: Fixture, args) -> dict:
+    """Every user tries to buy one unit of a SKU with `--flash-stock` units. Out-of-stock answers (400)
+    are expected; overselling is checked afterwards."""
+    inventory, orders = fixture.stack.clients["inventory"], fixture.stack.clients["order"]
+    response = await inventory.post("/items/", headers=fixture.admin["headers"], json={
+        "name": "flash-sale", "category": "shoes", "quantity": args.flash_stock, "price": 49.99
+    })
+    response.raise_for_status()
+    hot_id = response.json()["id"]
+    sold = 0
+
+    async def job(recorder: Recorder, i: int):
+        nonlocal sold
+        account = fixture.users[i % len(fixture.users)]
+        response = await recorder.request(
+            orders, "POST", "/orders/", "POST /orders/", expected=(200, 400),
+            json={"user_id": 0, "item_id": hot_id, "quantity": 1, "total_price": 0},
+            headers={**account["headers"], "Idempotency-Key": f"flash-{i}"}
+        )
+        if response is not None and response.status_code == 200:
+            sold += 1
+
+    recorder = await measure(job, args.concurrency, args.requests)
+    report = recorder.report()
+    remaining = (await inventory.get(f"/items/{hot_id}")).json()["quantity"]
+    report["checks"] = {
+        "stock": args.flash_stock, "sold": sold, "remaining": remaining,
+        "consistent": sold + remaining == args.flash_stock and sold == min(args.flash_stock, args.requests)
+    }
+    return report
+
+async def order_export(fixture: Fixture, args) -> dict:
+    """Admin export of every order, by keyset pages and as one NDJSON stream"""
+    orders = fixture.stack.clients["order"]
+    # Enough orders to page through, on top of whatever the flash sale sold; not part of the report's
+    # timings, failures only show up in its checks
+    async def place(recorder: Recorder, i: int):
+        account = fixture.users[i % len(fixture.users)]
+        await recorder.request(orders, "POST", "/orders/", "POST /orders/", headers=account["headers"], json={
+            "user_id": 0, "item_id": fixture.item_ids[i % len(fixture.item_ids)], "quantity": 1, "total_price": 0
+        })
+
+    placed = await measure(place, args.concurrency, args.export_orders)
+    headers = fixture.admin["headers"]
+
+    async def job(recorder: Recorder, i: int):
+        if i % 2:
+            await recorder.request(orders, "GET", "/orders/", "GET /orders/?stream", params={"stream": "true"}, headers=headers)
+            return
+        cursor = None
+        while True:
+            params = {"limit": 100}
+            if cursor:
+                params["after"] = cursor
+            response = await recorder.request(orders, "GET", "/orders/", "GET /orders/?after", params=params, headers=headers)
+            cursor = response.headers.get("X-Next-Cursor") if response is not None else None
+            if not cursor:
+                break
+
+    recorder = await measure(job, max(1, args.concurrency // 10), args.export_rounds)
+    report = recorder.report()
+    report["checks"] = {"orders_placed": args.export_orders, "place_errors": sum(placed.errors.values())}
+    return report
+
+SCENARIOS = {
+    "login_storm": login_storm,
+    "catalog_browse": catalog_browse,
+    "flash_sale": flash_sale,
+    "order_export": order_export,
+}
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[dict]:
+    """Endpoints that got slower, lost throughput or fail more often than in the baseline"""
+    regressions = []
+    for scenario, result in report["scenarios"].items():
+        base_endpoints = baseline.get("scenarios", {}).get(scenario, {}).get("endpoints", {})
+        for label, current in result["endpoints"].items():
+            base = base_endpoints.get(label)
+            if base is None:
+                continue
+            checks = [
+                ("p95_ms", current["p95_ms"] > base["p95_ms"] * (1 + tolerance)),
+                ("throughput_rps", current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance)),
+                ("error_rate", current["error_rate"] > base["error_rate"] + 0.01),
+            ]
+            for metric, regressed in checks:
+                if regressed:
+                    regressions.append({"scenario": scenario, "endpoint": label, "metric": metric,
+                                        "baseline": base[metric], "current": current[metric]})
+    return regressions
+
+def print_report(report: dict):
+    for scenario, result in report["scenarios"].items():
+        print(f"\n{scenario}: {result['requests']} requests in {result['duration_s']}s "
+              f"({result['throughput_rps']} req/s)")
+        for label, stats in result["endpoints"].items():
+            print(f"  {label:<28} {stats['count']:>6}  {stats['throughput_rps']:>8} req/s  "
+                  f"p50 {stats['p50_ms']:>8} ms  p95 {stats['p95_ms']:>8} ms  p99 {stats['p99_ms']:>8} ms  "
+                  f"errors {stats['error_rate']:.2%}")
+        if "checks" in result:
+            print(f"  checks: {result['checks']}")
+    for regression in report.get("regressions", []):
+        print(f"REGRESSION {regression['scenario']} {regression['endpoint']} {regression['metric']}: "
+              f"{regression['baseline']} -> {regression['current']}")
+
+async def main(args) -> int:
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)}")
+    report = {
+        "meta": {
+            "python": platform.python_version(), "database": "sqlite" if args.database == "sqlite" else "url",
+            "concurrency": args.concurrency, "requests": args.requests, "users": args.users,
+            "items": args.items, "stock_events": args.stock_events, "started_at": time.time(),
+        },
+        "scenarios": {},
+    }
+    async with Stack(database=args.database, stock_events=args.stock_events) as stack:
+        fixture = Fixture(stack, args.users, args.items, args.concurrency)
+        await fixture.setup()
+        for name in names:
+            report["scenarios"][name] = await SCENARIOS[name](fixture, args)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance)
+        status = 1 if report["regressions"] else 0
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return status
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--database", default="sqlite", help='"sqlite" or an async SQLAlchemy URL')
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=1000, help="requests (or jobs) per scenario")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--flash-stock", type=int, default=100)
+    parser.add_argument("--export-orders", type=int, default=500)
+    parser.add_argument("--export-rounds", type=int, default=20)
+    parser.add_argument("--stock-events", action="store_true", help="feed order_service's stock projection")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,91 @@
+"""Per-request cost of HTTP metrics, before and after the raw ASGI middleware.
+
+    python benchmarks/metrics_overhead.py [--requests 5000]
+
+"old" reproduces the previous inventory setup: @app.middleware("http") with regex path
+sanitising, plus a REQUEST_COUNT.labels(...).inc() in the handler (every request counted twice).
+"new" is PrometheusMiddleware from inventory_service and nothing in the handler.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "inventory_service"))
+
+from app.utils.metrics import REQUEST_COUNT, REQUEST_LATENCY, PrometheusMiddleware, sanitize_path  # noqa: E402
+
+def bare_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: int):
+        return {"id": item_id}
+
+    return app
+
+def old_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def metrics_middleware(request: Request, call_next):
+        start_time = time.time()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            path = sanitize_path(request.url.path)
+            REQUEST_LATENCY.labels(method=request.method.lower(), path=path).observe(time.time() - start_time)
+            REQUEST_COUNT.labels(method=request.method.lower(), path=path, status_code=str(status_code)).inc()
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: int):
+        REQUEST_COUNT.labels(method="get", path="items/{id}", status_code="200").inc()
+        return {"id": item_id}
+
+    return app
+
+def new_app() -> FastAPI:
+    app = bare_app()
+    app.add_middleware(PrometheusMiddleware)
+    return app
+
+async def per_request_us(app: FastAPI, requests: int) -> float:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for i in range(100):  # warm up routing and label children
+            await client.get(f"/items/{i}")
+        start = time.perf_counter()
+        for i in range(requests):
+            await client.get(f"/items/{i}")
+        return (time.perf_counter() - start) / requests * 1e6
+
+def counter_us(loops: int) -> tuple[float, float]:
+    start = time.perf_counter()
+    for _ in range(loops):
+        REQUEST_COUNT.labels(method="get", path="/items/{item_id}", status_code="200").inc()
+    labelled = (time.perf_counter() - start) / loops * 1e6
+    child = REQUEST_COUNT.labels(method="get", path="/items/{item_id}", status_code="200")
+    start = time.perf_counter()
+    for _ in range(loops):
+        child.inc()
+    return labelled, (time.perf_counter() - start) / loops * 1e6
+
+async def main(requests: int):
+    results = {name: await per_request_us(factory(), requests) for name, factory in
+               (("bare", bare_app), ("old", old_app), ("new", new_app))}
+    for name, us in results.items():
+        overhead = us - results["bare"]
+        print(f"{name:>5}: {us:8.1f} us/request  (metrics overhead {overhead:+7.1f} us)")
+    labelled, cached = counter_us(requests * 10)
+    print(f"counter .labels().inc(): {labelled:.3f} us, cached child .inc(): {cached:.3f} us")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    asyncio.run(main(parser.parse_args().requests))
@@ -0,0 +1,298 @@
+"""Micro-benchmarks of the per-request work that isn't the database.
+
+    python benchmarks/micro.py [--filter jwt] [--rows 100] [--rounds 15] [--min-time 0.05]
+                               [--output micro.json] [--baseline old.json --tolerance 0.1]
+
+Each case is warmed up, then timed in --rounds rounds of as many calls as fit in --min-time,
+with the garbage collector off during a round (as timeit does). Per-call min, median, mean,
+stdev and IQR are reported; compare medians, min is the least noisy for tiny functions.
+Serialization cases also report the median per row: run with a few --rows values to separate
+the per-response overhead from the per-row cost (the .orjson cases need orjson installed).
+
+The services are imported through harness.load_service, nothing is started and no database
+is touched: only caches that are normally warm by the second request are pre-filled.
+"""
+import argparse
+import asyncio
+import gc
+import inspect
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+from jose import jwt
+from pydantic import TypeAdapter
+
+from harness import configure_env, load_service
+
+class Case:
+    def __init__(self, name: str, fn, note: str = ""):
+        self.name = name
+        self.fn = fn
+        self.note = note
+        self.is_async = inspect.iscoroutinefunction(fn)
+
+    async def run(self, number: int) -> float:
+        """Seconds for `number` calls"""
+        fn = self.fn
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            if self.is_async:
+                for _ in range(number):
+                    await fn()
+            else:
+                for _ in range(number):
+                    fn()
+            return time.perf_counter() - start
+        finally:
+            gc.enable()
+
+async def measure(case: Case, rounds: int, min_time: float) -> dict:
+    # Warm up (caches, label children, code paths) and find a call count filling min_time
+    number = 1
+    while True:
+        elapsed = await case.run(number)
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed > min_time / 10 else 10
+    timings = sorted([(await case.run(number)) / number for _ in range(rounds)])
+    quartiles = statistics.quantiles(timings, n=4) if len(timings) > 1 else [timings[0]] * 3
+    return {
+        "calls_per_round": number,
+        "rounds": rounds,
+        "min_us": round(timings[0] * 1e6, 3),
+        "median_us": round(statistics.median(timings) * 1e6, 3),
+        "mean_us": round(statistics.fmean(timings) * 1e6, 3),
+        "stdev_us": round(statistics.stdev(timings) * 1e6, 3) if len(timings) > 1 else 0.0,
+        "iqr_us": round((quartiles[2] - quartiles[0]) * 1e6, 3),
+    }
+
+def jwt_cases(services: dict) -> list[Case]:
+    secret, algorithm = os.environ["SECRET_KEY"], os.environ.get("ALGORITHM", "HS256")
+    claims = {"sub": "bench@example.com", "role": "user", "user_id": 1, "exp": int(time.time()) + 3600}
+    token = jwt.encode(claims, secret, algorithm=algorithm)
+    cases = []
+    # inventory's dependency also takes a (unused) db session
+    for name, call_args in (("order", (token,)), ("inventory", (token, None))):
+        get_current_user = services[name].module("app.auth.jwt_handler").get_current_user
+        cache = services[name].module("app.auth.token_cache").token_cache
+
+        async def cached(get_current_user=get_current_user, call_args=call_args):
+            await get_current_user(*call_args)
+
+        async def uncached(get_current_user=get_current_user, call_args=call_args, cache=cache):
+            cache.clear()
+            await get_current_user(*call_args)
+
+        cases.append(Case(f"jwt.{name}.get_current_user.cached", cached, "token cache hit"))
+        cases.append(Case(f"jwt.{name}.get_current_user.uncached", uncached, "full jwt.decode"))
+
+    # user_service also loads the caller's profile; with it in the principal cache no query runs
+    user = services["user"]
+    handler = user.module("app.auth.jwt_handler")
+    UserOut = user.module("app.schemas.user").UserOut
+    user.module("app.auth.principal_cache").principal_cache.put(1, UserOut(
+        id=1, username="bench", email="bench@example.com", role="user", is_active=True,
+        created_at=datetime.now(timezone.utc)
+    ))
+
+    async def user_cached():
+        await handler.get_current_user(token, None)
+
+    cases.append(Case("jwt.user.get_current_user.cached", user_cached, "token + principal cache hit"))
+    cases.append(Case("jwt.decode", lambda: jwt.decode(token, secret, algorithms=[algorithm]), "python-jose alone"))
+    return cases
+
+def _fastapi_style(adapter: TypeAdapter, rows, from_attributes: bool):
+    """What FastAPI does with a response_model: validate, dump in JSON mode, json.dumps"""
+    def serialize():
+        value = adapter.validate_python(rows, from_attributes=from_attributes)
+        return json.dumps(adapter.dump_python(value, mode="json"), ensure_ascii=False, separators=(",", ":"))
+    return serialize
+
+def _dump_json(adapter: TypeAdapter, rows, from_attributes: bool):
+    def serialize():
+        return adapter.dump_json(adapter.validate_python(rows, from_attributes=from_attributes))
+    return serialize
+
+def _fast_json(fast_json, model, rows):
+    """The list endpoints' fast path: precomputed getters straight into orjson, no validation"""
+    def serialize():
+        return fast_json.json_rows_response(rows, model).body
+    return serialize
+
+def serialization_cases(services: dict, rows: int) -> list[Case]:
+    inventory, order, user = services["inventory"], services["order"], services["user"]
+    # Inventory routes return dicts (item_to_dict, the per-item cache)
+    items = [
+        {"id": i, "name": f"item-{i}", "category": "shirts", "quantity": 10 + i, "price": 9.99 + i, "version": 1}
+        for i in range(rows)
+    ]
+    Order, OrderLine = order.module("app.models.order").Order, order.module("app.models.order").OrderLine
+    orders = [
+        Order(id=i, user_id=1, item_id=None if i % 5 == 0 else i, quantity=None if i % 5 == 0 else 1,
+              total_price=19.98, status="confirmed",
+              lines=[OrderLine(item_id=i, quantity=2, unit_price=9.99)] if i % 5 == 0 else [])
+        for i in range(rows)
+    ]
+    User = user.module("app.models.user").User
+    users = [
+        User(id=i, username=f"user{i}", email=f"user{i}@example.com", hashed_password="x", is_active=True,
+             role="user", created_at=datetime.now(timezone.utc))
+        for i in range(rows)
+    ]
+    cases = []
+    for service, label, model, data, from_attributes in (
+        (inventory, "ItemOut", inventory.module("app.schemas.item").ItemOut, items, False),
+        (order, "OrderOut", order.module("app.schemas.order").OrderOut, orders, True),
+        (user, "UserOut", user.module("app.schemas.user").UserOut, users, True),
+    ):
+        adapter = TypeAdapter(list[model])
+        cases.append(Case(f"serialize.{label}.x{rows}.fastapi", _fastapi_style(adapter, data, from_attributes)))
+        cases.append(Case(f"serialize.{label}.x{rows}.dump_json", _dump_json(adapter, data, from_attributes)))
+        fast_json = service.module("app.utils.fast_json")
+        if fast_json.fast_json_enabled():
+            cases.append(Case(f"serialize.{label}.x{rows}.orjson", _fast_json(fast_json, model, data)))
+    return cases
+
+def path_cases(services: dict) -> list[Case]:
+    sanitize_path = services["inventory"].module("app.utils.metrics").sanitize_path
+    paths = ["/items/123", "/items/reservations/order-7-abc/commit", "/items/", "/items/9/reserve"]
+
+    def sanitize():
+        for path in paths:
+            sanitize_path(path)
+
+    return [Case("sanitize_path.x4", sanitize, "regex labelling the old middleware did per request")]
+
+def middleware_cases(services: dict) -> list[Case]:
+    """The raw ASGI middleware around an endpoint that does nothing, against the endpoint alone"""
+    class Route:
+        path = "/items/{item_id}"
+
+    async def endpoint(scope, receive, send):
+        scope["route"] = Route
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    async def bare():
+        await endpoint({"type": "http", "method": "GET", "path": "/items/1"}, receive, send)
+
+    cases = [Case("asgi.bare", bare)]
+    for name in ("inventory", "order"):
+        middleware = services[name].module("app.utils.metrics").PrometheusMiddleware(endpoint)
+
+        async def call(middleware=middleware):
+            await middleware({"type": "http", "method": "GET", "path": "/items/1"}, receive, send)
+
+        cases.append(Case(f"asgi.{name}.PrometheusMiddleware", call, "subtract asgi.bare for the overhead"))
+    sql_middleware = services["inventory"].module("app.db.instrumentation").SQLStatsMiddleware(endpoint)
+
+    async def sql_stats():
+        await sql_middleware({"type": "http", "method": "GET", "path": "/items/1"}, receive, send)
+
+    cases.append(Case("asgi.inventory.SQLStatsMiddleware", sql_stats))
+    tracing_middleware = services["inventory"].module("app.utils.tracing").TracingMiddleware(endpoint)
+
+    async def tracing():
+        await tracing_middleware({"type": "http", "method": "GET", "path": "/items/1", "headers": []}, receive, send)
+
+    cases.append(Case("asgi.inventory.TracingMiddleware", tracing, "span + Server-Timing, TRACE_EXPORTER decides export"))
+    return cases
+
+async def service_request_cases(services: dict) -> list[Case]:
+    clients = services["order"].module("app.utils.service_clients")
+    item = {"id": 1, "name": "item", "category": "shirts", "quantity": 10, "price": 9.99}
+    reservation = {"item_id": 1, "qty": 1, "remaining": 9, "unit_price": 9.99, "total_price": 9.99}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            return httpx.Response(200, json=reservation)
+        return httpx.Response(200, json=item, headers={"ETag": '"1.1"'})
+
+    await clients.start_service_clients({"inventory": httpx.MockTransport(handler)})
+
+    async def get():
+        await clients.make_service_request("GET", clients.INVENTORY_SERVICE_URL, "/items/1")
+
+    async def post():
+        await clients.make_service_request(
+            "POST", clients.INVENTORY_SERVICE_URL, "/items/1/reserve",
+            json={"qty": 1}, headers={"Idempotency-Key": "bench"}
+        )
+
+    async def lookup():
+        # Bypass the micro-TTL cache, so this measures a collapsed-or-fetched lookup with ETag handling
+        clients._lookup_cache.clear()
+        await clients.get_item_by_id(1)
+
+    return [
+        Case("service_request.GET", get, "breaker + retry budget + adaptive timeout + httpx, mock transport"),
+        Case("service_request.POST.idempotent", post),
+        Case("service_request.get_item_by_id.uncached", lookup),
+    ]
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[dict]:
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get("cases", {}).get(name)
+        if base and current["median_us"] > base["median_us"] * (1 + tolerance):
+            regressions.append({"case": name, "baseline_us": base["median_us"], "current_us": current["median_us"]})
+    return regressions
+
+async def main(args) -> int:
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        configure_env("sqlite", workdir)
+        services = {name: load_service(name) for name in ("user", "inventory", "order")}
+        cases = (
+            jwt_cases(services) + serialization_cases(services, args.rows) + path_cases(services)
+            + middleware_cases(services) + await service_request_cases(services)
+        )
+        results = {}
+        for case in cases:
+            if args.filter and args.filter not in case.name:
+                continue
+            stats = results[case.name] = await measure(case, args.rounds, args.min_time)
+            if case.name.startswith("serialize."):
+                stats["per_row_us"] = round(stats["median_us"] / args.rows, 3)
+            note = f"{stats['per_row_us']:.3f} us/row" if "per_row_us" in stats else case.note
+            print(f"{case.name:<48} median {stats['median_us']:>10.3f} us  min {stats['min_us']:>10.3f} us  "
+                  f"iqr {stats['iqr_us']:>8.3f} us  {note}")
+        await services["order"].module("app.utils.service_clients").close_service_clients()
+
+    report = {"meta": {"python": sys.version.split()[0], "rows": args.rows, "rounds": args.rounds}, "cases": results}
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(results, json.load(f), args.tolerance)
+        for regression in report["regressions"]:
+            print(f"REGRESSION {regression['case']}: {regression['baseline_us']} -> {regression['current_us']} us")
+        status = 1 if report["regressions"] else 0
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return status
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", help="only cases whose name contains this")
+    parser.add_argument("--rows", type=int, default=100, help="rows per serialization case")
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds per round")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare medians against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -8,6 +8,7 @@ from dotenv import load_dotenv
 
 from app.db.database import Base  # Your models' Base class
 from app.models import item  # Import your model
+from app.models import reservation
 
 load_dotenv()
 
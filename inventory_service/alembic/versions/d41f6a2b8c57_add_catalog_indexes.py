@@ -0,0 +1,34 @@
+"""add catalog indexes
+
+Revision ID: d41f6a2b8c57
+Revises: 9e3b7c51d2a4
+Create Date: 2026-10-18 14:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41f6a2b8c57'
+down_revision: Union[str, Sequence[str], None] = '9e3b7c51d2a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_items_category_id', 'items', ['category', 'id'], unique=False)
+    op.create_index('ix_items_category_price_id', 'items', ['category', 'price', 'id'], unique=False)
+    op.create_index('ix_items_price_id', 'items', ['price', 'id'], unique=False)
+    op.create_index('ix_items_name_id', 'items', ['name', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_items_name_id', table_name='items')
+    op.drop_index('ix_items_price_id', table_name='items')
+    op.drop_index('ix_items_category_price_id', table_name='items')
+    op.drop_index('ix_items_category_id', table_name='items')
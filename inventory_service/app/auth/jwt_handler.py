@@ -4,6 +4,7 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.database import get_db
+from app.auth.token_cache import decode_token
 import os
 from dotenv import load_dotenv
 
@@ -30,7 +31,7 @@ async def get_current_user(
     )
 
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token, SECRET_KEY, ALGORITHM)
         email: str = payload.get("sub")
         role: str = payload.get("role")
         if email is None or role is None:
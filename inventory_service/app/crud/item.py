@@ -1,22 +1,146 @@
+import hashlib
+import json
+import os
+from sqlalchemy import tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from app.db.database import AsyncSessionLocal
 from app.models.item import Item
 from app.schemas.item import ItemCreate, ItemUpdate
+from app.utils.cache import cache_get, cache_set_many, get_catalog_generation, invalidate_item
+from app.utils.stock_events import stock_changed
+
+# Item metadata (name, category, price) and catalog listings rarely change and are invalidated on write.
+# Stock changes on every order, so it is cached separately and only very briefly.
+ITEM_CACHE_TTL = float(os.getenv("ITEM_CACHE_TTL", 300))
+ITEM_STOCK_TTL = float(os.getenv("ITEM_STOCK_TTL", 1))
+# A deleted item's fence: no cached row is recent enough
+DELETED_VERSION = 2 ** 62
 
 async def create_item(db: AsyncSession, item: ItemCreate):
     new_item = Item(**item.dict())  # item.dict() converts a Pydantic model instance into Python dictionary
     db.add(new_item)
     await db.commit()
     await db.refresh(new_item)
+    await invalidate_item(new_item.id, metadata=True)
+    stock_changed(new_item.id)
     return new_item
  
-async def get_all_items(db: AsyncSession):
-    result = await db.execute(select(Item))
+# Catalog sort keys; each is paired with id as tie-breaker and backed by a (column, id) index
+SORT_COLUMNS = {"id": Item.id, "price": Item.price, "name": Item.name}
+
+def _items_query(category: str | None = None, min_price: float | None = None, max_price: float | None = None,
+                 sort: str = "id", after: list | None = None):
+    """Filtered catalog in keyset order. `sort` is a SORT_COLUMNS key, prefixed with "-" for descending.
+    `after` is the [sort value, id] of the last row already sent."""
+    descending = sort.startswith("-")
+    column = SORT_COLUMNS[sort.lstrip("-")]
+    query = select(Item)
+    if category is not None:
+        query = query.where(Item.category == category)
+    if min_price is not None:
+        query = query.where(Item.price >= min_price)
+    if max_price is not None:
+        query = query.where(Item.price <= max_price)
+    if after is not None:
+        if column is Item.id:
+            last_id = after[-1]
+            query = query.where(Item.id < last_id if descending else Item.id > last_id)
+        else:
+            # Row-value comparison, so the database can seek straight into the (column, id) index
+            key, last = tuple_(column, Item.id), tuple_(*after)
+            query = query.where(key < last if descending else key > last)
+    if column is Item.id:
+        return query.order_by(Item.id.desc() if descending else Item.id)
+    if descending:
+        return query.order_by(column.desc(), Item.id.desc())
+    return query.order_by(column, Item.id)
+
+def item_cursor_values(item: dict, sort: str = "id") -> list:
+    column = sort.lstrip("-")
+    return [item["id"]] if column == "id" else [item[column], item["id"]]
+
+async def get_all_items(db: AsyncSession, limit: int | None = None, **filters):
+    """One catalog page. `filters`: category, min_price, max_price, sort, after"""
+    query = _items_query(**filters)
+    if limit is not None:
+        query = query.limit(limit)
+    result = await db.execute(query)
     return result.scalars().all()
 
+async def stream_items(batch_size: int = 1000, **filters):
+    """Yield the whole (filtered) catalog from a server-side cursor, for exports.
+    Opens its own session, the request's session is closed before a streamed body is sent."""
+    query = _items_query(**filters).execution_options(yield_per=batch_size)
+    async with AsyncSessionLocal() as session:
+        result = await session.stream_scalars(query)
+        async for item in result:
+            yield item
+
 async def get_item_by_id(db: AsyncSession, item_id: int):
     return await db.get(Item, item_id)
 
+def item_to_dict(item: Item) -> dict:
+    return {
+        "id": item.id, "name": item.name, "category": item.category,
+        "quantity": item.quantity, "price": item.price, "version": item.version
+    }
+
+# Fields that change with every stock movement, cached under stock:{id}
+STOCK_FIELDS = ("quantity", "version")
+
+async def _cache_items(items) -> list[dict]:
+    rows = [item_to_dict(item) for item in items]
+    # The cached row keeps the version it was read at, checked against the item's fence when served
+    await cache_set_many(
+        {f"item:{row['id']}": {k: v for k, v in row.items() if k != "quantity"} for row in rows},
+        ITEM_CACHE_TTL
+    )
+    await cache_set_many({f"stock:{row['id']}": [row[k] for k in STOCK_FIELDS] for row in rows}, ITEM_STOCK_TTL)
+    return rows
+
+async def _load_items(db: AsyncSession, item_ids: list[int]) -> dict[int, dict]:
+    """Items as dicts, from the cache where possible and one query for the rest"""
+    n = len(item_ids)
+    values = await cache_get(
+        *[f"item:{i}" for i in item_ids], *[f"stock:{i}" for i in item_ids], *[f"fence:{i}" for i in item_ids]
+    )
+    items, missing = {}, []
+    for item_id, meta, stock, fence in zip(item_ids, values, values[n:2 * n], values[2 * n:]):
+        # A row read before the last edit may have been cached after its invalidation: never serve it
+        if meta is None or stock is None or meta.get("version", -1) < (fence or 0):
+            missing.append(item_id)
+        else:
+            items[item_id] = {**meta, **dict(zip(STOCK_FIELDS, stock))}
+    if missing:
+        result = await db.execute(select(Item).where(Item.id.in_(missing)))
+        for row in await _cache_items(result.scalars().all()):
+            items[row["id"]] = row
+    return items
+
+async def get_item_cached(db: AsyncSession, item_id: int) -> dict | None:
+    """Read-through version of get_item_by_id, returns a dict"""
+    return (await _load_items(db, [item_id])).get(item_id)
+
+async def get_items_page_cached(db: AsyncSession, limit: int | None = None, **filters) -> list[dict]:
+    """Read-through version of get_all_items. The page's ids are cached per catalog generation,
+    the rows themselves come from the per-item cache, so stock stays fresh."""
+    generation = await get_catalog_generation()
+    params = json.dumps([generation, limit, filters], sort_keys=True, default=str)
+    key = "catalog:" + hashlib.sha1(params.encode()).hexdigest()
+    [item_ids] = await cache_get(key)
+    if item_ids is None:
+        rows = await _cache_items(await get_all_items(db, limit=limit, **filters))
+        await cache_set_many({key: [row["id"] for row in rows]}, ITEM_CACHE_TTL)
+        return rows
+    items = await _load_items(db, item_ids)
+    return [items[item_id] for item_id in item_ids if item_id in items]
+
+async def _fence_item(item_id: int, version: int):
+    """After an edit: cached rows older than `version` are refused from now on. Outlives any row
+    cached by a reader that loaded the item before the edit committed."""
+    await cache_set_many({f"fence:{item_id}": version}, ITEM_CACHE_TTL * 2)
+
 async def update_item(db: AsyncSession, item_id: int, item_data: ItemUpdate):
     item = await db.get(Item, item_id)
     if not item:
@@ -25,8 +149,12 @@ async def update_item(db: AsyncSession, item_id: int, item_data: ItemUpdate):
     # setattr(item, key, value) → updates each field of the SQLAlchemy model dynamically.
     for key, value in item_data.dict(exclude_unset=True).items():
         setattr(item, key, value)
+    item.version += 1
     await db.commit()
     await db.refresh(item)
+    await _fence_item(item_id, item.version)
+    await invalidate_item(item_id, metadata=True)
+    stock_changed(item_id)
     return item
 
 async def delete_item(db: AsyncSession, item_id: int):
@@ -35,4 +163,62 @@ async def delete_item(db: AsyncSession, item_id: int):
         return None
     await db.delete(item)
     await db.commit()
+    await _fence_item(item_id, DELETED_VERSION)
+    await invalidate_item(item_id, metadata=True)
+    stock_changed(item_id)
     return {"message": "deleted"}
+
+async def reserve_stock(db: AsyncSession, item_id: int, qty: int, commit: bool = True):
+    # Conditional decrement in a single statement, so concurrent reservations can never oversell:
+    # UPDATE items SET quantity = quantity - :qty WHERE id = :id AND quantity >= :qty RETURNING quantity, price
+    result = await db.execute(
+        update(Item)
+        .where(Item.id == item_id, Item.quantity >= qty)
+        .values(quantity=Item.quantity - qty, version=Item.version + 1)
+        .returning(Item.quantity, Item.price)
+    )
+    row = result.first()
+    if commit:
+        await db.commit()
+        if row is not None:
+            await invalidate_item(item_id)
+            stock_changed(item_id)
+    return row  # None when the item is missing or has too little stock
+
+async def release_stock(db: AsyncSession, item_id: int, qty: int, commit: bool = True):
+    result = await db.execute(
+        update(Item)
+        .where(Item.id == item_id)
+        .values(quantity=Item.quantity + qty, version=Item.version + 1)
+        .returning(Item.quantity)
+    )
+    row = result.first()
+    if commit:
+        await db.commit()
+        if row is not None:
+            await invalidate_item(item_id)
+            stock_changed(item_id)
+    return row
+
+async def reserve_stock_batch(db: AsyncSession, lines: dict[int, int], commit: bool = True):
+    """Reserve several items in one transaction, all or nothing.
+    `lines` maps item_id -> qty. Returns (items, missing_ids, short_ids)."""
+    # Row locks are taken in ascending id order, so two overlapping carts can't deadlock
+    ids = sorted(lines)
+    result = await db.execute(
+        select(Item).where(Item.id.in_(ids)).order_by(Item.id).with_for_update()
+    )
+    items = {item.id: item for item in result.scalars()}
+    missing = [item_id for item_id in ids if item_id not in items]
+    short = [item_id for item_id in ids if item_id in items and items[item_id].quantity < lines[item_id]]
+    if missing or short:
+        await db.rollback()
+        return None, missing, short
+    for item_id in ids:
+        items[item_id].quantity -= lines[item_id]
+        items[item_id].version += 1
+    if commit:
+        await db.commit()
+        await invalidate_item(*ids)
+        stock_changed(*ids)
+    return [items[item_id] for item_id in ids], [], []
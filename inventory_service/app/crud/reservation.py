@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.models.item import Item
+from app.models.reservation import Reservation, RESERVED, COMMITTED, RELEASED
+from app.crud.item import reserve_stock, release_stock, reserve_stock_batch
+from app.utils.cache import invalidate_item
+from app.utils.stock_events import stock_changed
+from app.utils.metrics import STOCK_RESERVED, STOCK_RELEASED
+import os
+
+# Reservations that are neither committed nor released within this window are released by the sweeper
+RESERVATION_TTL_SECONDS = int(os.getenv("RESERVATION_TTL_SECONDS", 900))
+
+async def get_reservation(db: AsyncSession, key: str, for_update: bool = False):
+    query = select(Reservation).where(Reservation.idempotency_key == key).order_by(Reservation.item_id)
+    if for_update:
+        query = query.with_for_update()
+    result = await db.execute(query)
+    return result.scalars().all()
+
+async def create_reservation(db: AsyncSession, key: str, lines: dict[int, int]):
+    """Reserve stock under an idempotency key, all or nothing.
+    Replaying a key returns the rows of the first call without touching stock again.
+    Returns (reservations, missing_ids, short_ids)."""
+    existing = await get_reservation(db, key)
+    if existing:
+        return existing, [], []
+
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=RESERVATION_TTL_SECONDS)
+    if len(lines) == 1:
+        # Single item: one conditional UPDATE, no row lock round trip
+        [(item_id, qty)] = lines.items()
+        row = await reserve_stock(db, item_id, qty, commit=False)
+        if row is None:
+            await db.rollback()
+            if not await db.get(Item, item_id):
+                return None, [item_id], []
+            return None, [], [item_id]
+        prices = {item_id: row.price}
+    else:
+        items, missing, short = await reserve_stock_batch(db, lines, commit=False)
+        if items is None:
+            return None, missing, short
+        prices = {item.id: item.price for item in items}
+
+    reservations = [
+        Reservation(
+            idempotency_key=key,
+            item_id=item_id,
+            qty=lines[item_id],
+            unit_price=prices[item_id],
+            status=RESERVED,
+            expires_at=expires_at
+        )
+        for item_id in sorted(lines)
+    ]
+    db.add_all(reservations)
+    try:
+        # Stock decrement and reservation rows commit together
+        await db.commit()
+    except IntegrityError:
+        # A concurrent request with the same key won the race, its reservation stands and ours is rolled back
+        await db.rollback()
+        return await get_reservation(db, key), [], []
+    await invalidate_item(*lines)
+    stock_changed(*lines)
+    STOCK_RESERVED.inc(sum(lines.values()))
+    return reservations, [], []
+
+async def commit_reservation(db: AsyncSession, key: str):
+    reservations = await get_reservation(db, key, for_update=True)
+    if not reservations or any(r.status == RELEASED for r in reservations):
+        # Nothing to commit, or it already expired and the stock went back on sale.
+        # Nothing changed either, commit just ends the transaction without expiring the rows we return.
+        await db.commit()
+        return reservations
+    for reservation in reservations:
+        reservation.status = COMMITTED
+    await db.commit()
+    return reservations
+
+async def release_reservation(db: AsyncSession, key: str, reason: str = "release"):
+    """Compensate a reservation: put the stock back. Releasing twice is a no-op."""
+    reservations = await get_reservation(db, key, for_update=True)
+    if not reservations or any(r.status == COMMITTED for r in reservations):
+        await db.commit()
+        return reservations
+    released = 0
+    for reservation in reservations:
+        if reservation.status == RESERVED:
+            await release_stock(db, reservation.item_id, reservation.qty, commit=False)
+            reservation.status = RELEASED
+            released += reservation.qty
+    await db.commit()
+    await invalidate_item(*[r.item_id for r in reservations])
+    if released:
+        stock_changed(*[r.item_id for r in reservations])
+        STOCK_RELEASED.labels(reason=reason).inc(released)
+    return reservations
+
+async def release_expired_reservations(db: AsyncSession, limit: int = 100) -> int:
+    """Release reservations past their TTL, returns how many keys were released"""
+    result = await db.execute(
+        select(Reservation.idempotency_key)
+        .where(Reservation.status == RESERVED, Reservation.expires_at < datetime.now(timezone.utc))
+        .distinct()
+        .limit(limit)
+    )
+    keys = result.scalars().all()
+    for key in keys:
+        await release_reservation(db, key, reason="expired")
+    return len(keys)
@@ -1,13 +1,14 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 import os
 from dotenv import load_dotenv
+from app.db.engine import create_engine
 
 load_dotenv() 
 
 DATABASE_URL = os.getenv("INVENTORY_DATABASE_URL")
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+engine = create_engine(DATABASE_URL)
 
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
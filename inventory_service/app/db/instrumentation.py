@@ -0,0 +1,187 @@
+import contextvars
+import hashlib
+import os
+import re
+import time
+from app.utils.logger import logger
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.utils.metrics import DB_QUERY_LATENCY, DB_QUERY_ROWS, DB_STATEMENTS_PER_REQUEST
+from app.utils.tracing import record_span, add_timing
+
+# Statements slower than this are logged, SELECTs together with their EXPLAIN plan
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 200))
+DB_EXPLAIN_SLOW_QUERIES = os.getenv("DB_EXPLAIN_SLOW_QUERIES", "true").lower() in ("1", "true", "yes")
+# Distinct statement templates tracked for /debug/sql-stats
+SQL_STATS_MAX_TEMPLATES = int(os.getenv("SQL_STATS_MAX_TEMPLATES", 500))
+
+# "IN (?, ?, ?)" and "IN ($1, $2)" are the same template whatever the number of values
+_IN_LIST = re.compile(r"\(\s*(?:\?|\$\d+|%\(\w+\)s)(?:\s*,\s*(?:\?|\$\d+|%\(\w+\)s))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+# Raw statement -> (template id, template), normalised once per distinct statement
+_templates: dict[str, tuple[str, str]] = {}
+# Template id -> [template, calls, total seconds, max seconds, rows]
+_stats: dict[str, list] = {}
+# Template ids used as the "statement" metric label; past SQL_STATS_MAX_TEMPLATES they go to "other",
+# so SQL built with literals can't create Prometheus series without bound
+_labelled: set[str] = set()
+
+# Statement counter of the HTTP request being served, set by SQLStatsMiddleware
+_request_statements: contextvars.ContextVar[list | None] = contextvars.ContextVar("request_statements", default=None)
+
+def _template(statement: str) -> tuple[str, str]:
+    cached = _templates.get(statement)
+    if cached is None:
+        template = _IN_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+        cached = (hashlib.sha1(template.encode()).hexdigest()[:12], template)
+        if len(_templates) < SQL_STATS_MAX_TEMPLATES * 4:
+            _templates[statement] = cached
+    return cached
+
+def _explain(conn, statement: str, parameters) -> list:
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    # A separate cursor: the original one still holds the rows of the slow query
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return [tuple(row) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+def _label(template_id: str) -> str:
+    if template_id not in _labelled:
+        if len(_labelled) >= SQL_STATS_MAX_TEMPLATES:
+            return "other"
+        _labelled.add(template_id)
+    return template_id
+
+def _observe_rows(template_id: str, rows: int):
+    DB_QUERY_ROWS.labels(statement=_label(template_id)).observe(rows)
+    stats = _stats.get(template_id)
+    if stats is not None:
+        stats[4] += rows
+
+class _CountingCursor:
+    """Stands in for the DBAPI cursor of a statement returning rows (SELECT, RETURNING): counts the
+    rows the result actually fetches and reports them when the result closes the cursor"""
+
+    def __init__(self, cursor, template_id: str):
+        self._cursor = cursor
+        self._template_id = template_id
+        self._fetched = 0
+        self._reported = False
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._fetched += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._fetched += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._fetched += len(rows)
+        return rows
+
+    def close(self):
+        if not self._reported:
+            self._reported = True
+            _observe_rows(self._template_id, self._fetched)
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+def _record(conn, cursor, statement: str, parameters, executemany: bool, elapsed: float) -> str:
+    template_id, template = _template(statement)
+    DB_QUERY_LATENCY.labels(statement=_label(template_id)).observe(elapsed)
+
+    stats = _stats.get(template_id)
+    if stats is None and len(_stats) < SQL_STATS_MAX_TEMPLATES:
+        stats = _stats[template_id] = [template, 0, 0.0, 0.0, 0]
+    if stats is not None:
+        stats[1] += 1
+        stats[2] += elapsed
+        stats[3] = max(stats[3], elapsed)
+    # Rows affected by INSERT/UPDATE/DELETE; rows returned are counted by _CountingCursor as they are fetched
+    rows = cursor.rowcount if cursor.description is None and cursor.rowcount >= 0 else None
+    if rows is not None:
+        _observe_rows(template_id, rows)
+
+    counter = _request_statements.get()
+    if counter is not None:
+        counter[0] += 1
+    # Per-request trace: a span per statement and the database total in Server-Timing
+    record_span("db.query", elapsed, "client", **{"db.statement_id": template_id, "db.rows": rows})
+    add_timing("db", elapsed)
+
+    if elapsed * 1000 < DB_SLOW_QUERY_MS:
+        return template_id
+    plan = None
+    if DB_EXPLAIN_SLOW_QUERIES and not executemany and template.upper().startswith(("SELECT", "WITH")):
+        try:
+            plan = _explain(conn, statement, parameters)
+        except Exception:
+            logger.debug("EXPLAIN failed for statement %s", template_id, exc_info=True)
+    logger.warning(
+        "Slow query (%.1f ms): %s", elapsed * 1000, template,
+        extra={"statement_id": template_id, "duration_ms": round(elapsed * 1000, 1), "rows": rows, "plan": plan}
+    )
+    return template_id
+
+def instrument_engine(engine: AsyncEngine):
+    """Times every statement: per-template metrics, request statement counts and slow-query logging"""
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_start"] = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _end(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop("query_start")
+        template_id = _record(conn, cursor, statement, parameters, executemany, elapsed)
+        if context is not None and not executemany and cursor.description is not None:
+            # The result reads context.cursor, which is set up right after this event
+            context.cursor = _CountingCursor(cursor, template_id)
+
+def sql_stats(limit: int = 20) -> list[dict]:
+    """Statement templates with the most total time spent"""
+    top = sorted(_stats.items(), key=lambda entry: entry[1][2], reverse=True)[:limit]
+    return [
+        {
+            "id": template_id,
+            "statement": template,
+            "calls": calls,
+            "total_ms": round(total * 1000, 2),
+            "mean_ms": round(total * 1000 / calls, 3),
+            "max_ms": round(longest * 1000, 2),
+            "rows": rows
+        }
+        for template_id, (template, calls, total, longest, rows) in top
+    ]
+
+def reset_sql_stats():
+    _stats.clear()
+
+class SQLStatsMiddleware:
+    """Raw ASGI middleware counting the SQL statements each request runs (N+1 queries show up as outliers)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        counter = [0]
+        token = _request_statements.set(counter)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_statements.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            DB_STATEMENTS_PER_REQUEST.labels(path=path).observe(counter[0])
@@ -1,13 +1,36 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.routers import item
-from app.utils.metrics import metrics_middleware, metrics_endpoint
+from app.routers import item, debug
+from app.utils.metrics import PrometheusMiddleware, metrics_endpoint
+from app.utils.reservation_sweeper import run_reservation_sweeper
+from app.utils.stock_events import run_stock_event_publisher
+from app.db.instrumentation import SQLStatsMiddleware
+from app.utils.profiler import track_task_ages
+from app.utils.tracing import TracingMiddleware
 
-app = FastAPI(title="Inventory Service")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Creation times of tasks, for the ages in /debug/tasks
+    track_task_ages()
+    # Releases reservations that were never committed (order_service crashed, order failed, ...)
+    sweeper = asyncio.create_task(run_reservation_sweeper())
+    # Publishes stock changes for order_service's projection (STOCK_EVENTS_TRANSPORT)
+    publisher = asyncio.create_task(run_stock_event_publisher())
+    yield
+    publisher.cancel()
+    sweeper.cancel()
+
+app = FastAPI(title="Inventory Service", lifespan=lifespan)
 
 app.include_router(item.router)
+app.include_router(debug.router)
 
 # Add middleware
-app.middleware("http")(metrics_middleware)
+app.add_middleware(PrometheusMiddleware)
+app.add_middleware(SQLStatsMiddleware)
+# Outermost, so its span and Server-Timing cover the other middleware too
+app.add_middleware(TracingMiddleware)
 
 # Add /metrics route
 app.add_api_route("/metrics", endpoint=metrics_endpoint(), methods=["GET"])
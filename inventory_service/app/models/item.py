@@ -1,12 +1,21 @@
-from sqlalchemy import String, Integer, Float
+from sqlalchemy import String, Integer, Float, Index
 from sqlalchemy.orm import Mapped, mapped_column
 from app.db.database import Base
 
 class Item(Base):
     __tablename__ = "items"
-    
+    # Catalog listing filters by category and pages in (sort column, id) keyset order
+    __table_args__ = (
+        Index("ix_items_category_id", "category", "id"),
+        Index("ix_items_category_price_id", "category", "price", "id"),
+        Index("ix_items_price_id", "price", "id"),
+        Index("ix_items_name_id", "name", "id"),
+    )
+
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(100))
     category: Mapped[str] = mapped_column(String(50))
     quantity: Mapped[int] = mapped_column(Integer)
-    price: Mapped[float] = mapped_column(Float)
\ No newline at end of file
+    price: Mapped[float] = mapped_column(Float)
+    # Bumped on every change (metadata or stock), drives the ETags of item and catalog responses
+    version: Mapped[int] = mapped_column(Integer, default=1, server_default="1")
\ No newline at end of file
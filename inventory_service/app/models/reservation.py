@@ -0,0 +1,23 @@
+from datetime import datetime
+from sqlalchemy import String, Integer, Float, DateTime, UniqueConstraint, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.database import Base
+
+# Reservation lifecycle: reserved -> committed (order placed) or reserved -> released (order failed / TTL expired)
+RESERVED = "reserved"
+COMMITTED = "committed"
+RELEASED = "released"
+
+class Reservation(Base):
+    __tablename__ = "reservations"
+    # One row per item of a reservation, the Idempotency-Key groups them
+    __table_args__ = (UniqueConstraint("idempotency_key", "item_id", name="uq_reservations_key_item"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    idempotency_key: Mapped[str] = mapped_column(String(100), index=True)
+    item_id: Mapped[int] = mapped_column(Integer)
+    qty: Mapped[int] = mapped_column(Integer)
+    unit_price: Mapped[float] = mapped_column(Float)
+    status: Mapped[str] = mapped_column(String(20), default=RESERVED, index=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
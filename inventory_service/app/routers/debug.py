@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from app.auth.jwt_handler import get_current_user
+from app.db.instrumentation import sql_stats, reset_sql_stats
+from app.utils import tracing
+from app.utils.profiler import (
+    profile, list_tasks, ProfilerBusy, PROFILE_MAX_SECONDS, PROFILE_SAMPLE_INTERVAL_MS
+)
+
+router = APIRouter(prefix="/debug", tags=["Debug"])
+
+# Only Admins can see internals
+async def require_admin(user_info: dict = Depends(get_current_user)):
+    if user_info["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can access debug endpoints")
+    return user_info
+
+# Statement templates with the most total database time since start (or the last reset)
+@router.get("/sql-stats")
+async def read_sql_stats(limit: int = Query(20, ge=1, le=500), _: dict = Depends(require_admin)):
+    return sql_stats(limit)
+
+@router.delete("/sql-stats")
+async def clear_sql_stats(_: dict = Depends(require_admin)):
+    reset_sql_stats()
+    return {"message": "SQL stats reset"}
+
+# Sampling profile of every thread for `seconds`, as collapsed stacks (flamegraph.pl, speedscope)
+@router.get("/profile", response_class=PlainTextResponse)
+async def read_profile(
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(PROFILE_SAMPLE_INTERVAL_MS, ge=1, le=1000),
+    _: dict = Depends(require_admin)
+):
+    try:
+        return PlainTextResponse(await profile(seconds, interval_ms))
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+# Pending asyncio tasks with their age and where each one is waiting
+@router.get("/tasks")
+async def read_tasks(stack_limit: int = Query(20, ge=1, le=200), _: dict = Depends(require_admin)):
+    tasks = list_tasks(stack_limit)
+    return {"count": len(tasks), "tasks": tasks}
+
+# Recent spans from the in-memory exporter (TRACE_EXPORTER=memory), optionally of one trace
+@router.get("/traces")
+async def read_traces(
+    trace_id: str | None = None,
+    limit: int = Query(200, ge=1, le=5000),
+    _: dict = Depends(require_admin)
+):
+    if not isinstance(tracing.exporter, tracing.MemoryExporter):
+        raise HTTPException(status_code=404, detail="Spans are not kept in memory (TRACE_EXPORTER)")
+    return tracing.exporter.find(trace_id, limit)
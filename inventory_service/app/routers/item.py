@@ -1,15 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import math
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
 from typing import List
 
-from app.schemas.item import ItemCreate, ItemUpdate, ItemOut, QuantityUpdate
+from app.schemas.item import (
+    ItemCreate, ItemUpdate, ItemOut, QuantityUpdate,
+    ReservationOut, BatchReservationRequest, BatchReservationOut, ReservationStatusOut
+)
 from app.crud.item import (
-    create_item, get_all_items, get_item_by_id,
-    update_item, delete_item
+    create_item, stream_items, item_cursor_values, get_item_by_id,
+    get_item_cached, get_items_page_cached,
+    update_item, delete_item, reserve_stock, release_stock, reserve_stock_batch
 )
+from app.crud.reservation import create_reservation, commit_reservation, release_reservation
+from app.models.item import Item
+from app.models.reservation import COMMITTED, RELEASED
 from app.db.database import get_db
 from app.utils.logger import logger
-from app.utils.metrics import REQUEST_COUNT
+from app.utils.pagination import encode_cursor, decode_cursor
+from app.utils.etag import item_etag, catalog_etag, etag_matches
+from app.utils.fast_json import json_rows_response, dumps_row
+from app.utils.metrics import ITEMS_CREATED, STOCK_RESERVED, STOCK_RELEASED, OUT_OF_STOCK_REJECTIONS, RESERVATION_LATENCY
 from app.auth.jwt_handler import get_current_user  # Decodes JWT, includes role
 
 router = APIRouter(prefix="/items", tags=["Inventory"])
@@ -21,12 +34,6 @@ async def create_new_item(
     db: AsyncSession = Depends(get_db),
     user_info: dict = Depends(get_current_user)
 ):
-    REQUEST_COUNT.labels(
-    method="post",        # Must match your metric definition (lowercase)
-    path="items",         # "path" instead of "endpoint"
-    status_code="201"     # Add status code (201 for created)
-).inc()
-    
     if user_info["role"] != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -34,31 +41,101 @@ async def create_new_item(
         )
     
     logger.info(
-        f"Admin '{user_info['email']}' is creating new item '{item.name}'",
+        "Admin '%s' is creating new item '%s'", user_info['email'], item.name,
         extra={"item": item.name, "user": user_info['email']}
     )
-    return await create_item(db, item)
+    new_item = await create_item(db, item)
+    ITEMS_CREATED.inc()
+    return new_item
+
+async def _json_array(items):
+    # Streams "[item,item,...]" so a full export never sits in memory
+    yield b"["
+    first = True
+    async for item in items:
+        yield (b"" if first else b",") + dumps_row(item, ItemOut)
+        first = False
+    yield b"]"
+
+_INT64 = 2 ** 63
+
+def _cursor_value_ok(column: str, value) -> bool:
+    """A decoded cursor value has the type of its sort column; the database would fail on anything else"""
+    if isinstance(value, bool):
+        return False
+    if column == "id":
+        return isinstance(value, int) and -_INT64 <= value < _INT64
+    if column == "price":
+        return isinstance(value, (int, float)) and math.isfinite(value)
+    return isinstance(value, str)
 
 # Open to all authenticated users
 @router.get("/", response_model=List[ItemOut])
-async def read_all_items(db: AsyncSession = Depends(get_db)):
-    REQUEST_COUNT.labels(method="get", path="items", status_code="200").inc()
-    return await get_all_items(db)
+async def read_all_items(
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str | None = Query(None, description="X-Next-Cursor header of the previous page"),
+    category: str | None = None,
+    min_price: float | None = Query(None, ge=0),
+    max_price: float | None = Query(None, ge=0),
+    sort: str = Query("id", pattern="^-?(id|price|name)$", description="id, price or name, prefix with - for descending"),
+    stream: bool = Query(False, description="Stream the whole filtered catalog as one JSON array, ignores limit"),
+    if_none_match: str | None = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    after = None
+    if cursor is not None:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if len(after) != (1 if sort.lstrip("-") == "id" else 2):
+            raise HTTPException(status_code=400, detail="Cursor does not match sort order")
+        column = sort.lstrip("-")
+        columns = ["id"] if column == "id" else [column, "id"]
+        if not all(_cursor_value_ok(name, value) for name, value in zip(columns, after)):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    filters = {"category": category, "min_price": min_price, "max_price": max_price, "sort": sort, "after": after}
+
+    if stream:
+        return StreamingResponse(_json_array(stream_items(**filters)), media_type="application/json")
+
+    # Keyset pagination: one extra row tells us whether there is a next page
+    items = await get_items_page_cached(db, limit=limit + 1, **filters)
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(*item_cursor_values(items[-1], sort))
+    headers = {"ETag": catalog_etag(items, next_cursor)}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if etag_matches(if_none_match, headers["ETag"]):
+        # Client's copy is current: skip serialising the page altogether
+        return Response(status_code=304, headers=headers)
+    # Rows come from our own database or cache, no need to validate them again
+    fast_response = json_rows_response(items, ItemOut, headers)
+    if fast_response is not None:
+        return fast_response
+    response.headers.update(headers)
+    return items
 
 @router.get("/{item_id}", response_model=ItemOut)
-async def read_item(item_id: int, db: AsyncSession = Depends(get_db)):
-    try:
-        item = await get_item_by_id(db, item_id)
-        if not item:
-            logger.warning("Item not found", extra={"item_id": item_id})
-            REQUEST_COUNT.labels(method="get", path="items/{id}", status_code="404").inc()
-            raise HTTPException(status_code=404, detail="Item not found")
-        
-        REQUEST_COUNT.labels(method="get", path="items/{id}", status_code="200").inc()
-        return item
-    except Exception as e:
-        REQUEST_COUNT.labels(method="get", path="items/{id}", status_code="500").inc()
-        raise e
+async def read_item(
+    item_id: int,
+    response: Response,
+    if_none_match: str | None = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    item = await get_item_cached(db, item_id)
+    if not item:
+        logger.warning("Item not found", extra={"item_id": item_id})
+        raise HTTPException(status_code=404, detail="Item not found")
+    
+    etag = item_etag(item)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return item
 
 # Only Admins can update items
 @router.put("/{item_id}", response_model=ItemOut)
@@ -68,22 +145,15 @@ async def update_existing_item(
     db: AsyncSession = Depends(get_db),
     user_info: dict = Depends(get_current_user)
 ):
-    try:
-        if user_info["role"] != "admin":
-            REQUEST_COUNT.labels(method="put", path="items/{id}", status_code="403").inc()
-            raise HTTPException(status_code=403, detail="Only admins can update items")
-
-        updated_item = await update_item(db, item_id, item_data)
-        if not updated_item:
-            REQUEST_COUNT.labels(method="put", path="items/{id}", status_code="404").inc()
-            raise HTTPException(status_code=404, detail="Item not found")
-        
-        logger.info("Item updated", extra={"item_id": item_id, "user": user_info['email']})
-        REQUEST_COUNT.labels(method="put", path="items/{id}", status_code="200").inc()
-        return updated_item
-    except Exception as e:
-        REQUEST_COUNT.labels(method="put", path="items/{id}", status_code="500").inc()
-        raise e
+    if user_info["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can update items")
+
+    updated_item = await update_item(db, item_id, item_data)
+    if not updated_item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    
+    logger.info("Item updated", extra={"item_id": item_id, "user": user_info['email']})
+    return updated_item
 
 # Only Admins can delete items
 @router.delete("/{item_id}")
@@ -92,40 +162,152 @@ async def delete_existing_item(
     db: AsyncSession = Depends(get_db),
     user_info: dict = Depends(get_current_user)
 ):
-    try:
-        if user_info["role"] != "admin":
-            REQUEST_COUNT.labels(method="delete", path="items/{id}", status_code="403").inc()
-            raise HTTPException(status_code=403, detail="Only admins can delete items")
-
-        result = await delete_item(db, item_id)
-        if not result:
-            REQUEST_COUNT.labels(method="delete", path="items/{id}", status_code="404").inc()
+    if user_info["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can delete items")
+
+    result = await delete_item(db, item_id)
+    if not result:
+        raise HTTPException(status_code=404, detail="Item not found")
+    
+    logger.info("Item deleted", extra={"item_id": item_id, "user": user_info['email']})
+    return result
+
+
+async def _reserve_or_raise(db: AsyncSession, item_id: int, qty: int, endpoint: str):
+    if qty < 1:
+        raise HTTPException(status_code=400, detail="Quantity must be positive")
+    row = await reserve_stock(db, item_id, qty)
+    if row is None:
+        # Only the failure path pays for a second query, to tell "missing" from "out of stock"
+        if not await get_item_by_id(db, item_id):
             raise HTTPException(status_code=404, detail="Item not found")
-        
-        logger.info("Item deleted", extra={"item_id": item_id, "user": user_info['email']})
-        REQUEST_COUNT.labels(method="delete", path="items/{id}", status_code="200").inc()
-        return result
-    except Exception as e:
-        REQUEST_COUNT.labels(method="delete", path="items/{id}", status_code="500").inc()
-        raise e
+        OUT_OF_STOCK_REJECTIONS.labels(endpoint=endpoint).inc()
+        raise HTTPException(status_code=400, detail="Out of Stock")
+    STOCK_RESERVED.inc(qty)
+    return row
+
+async def _reserve_with_key(db: AsyncSession, key: str, quantities: dict[int, int], endpoint: str) -> list[ReservationOut]:
+    """Idempotent reservation: a retried request with the same key gets the original result back"""
+    reservations, missing, short = await create_reservation(db, key, quantities)
+    if missing:
+        raise HTTPException(status_code=404, detail={"message": "Item not found", "item_ids": missing})
+    if short:
+        OUT_OF_STOCK_REJECTIONS.labels(endpoint=endpoint).inc()
+        raise HTTPException(status_code=400, detail={"message": "Out of Stock", "item_ids": short})
+    if {r.item_id: r.qty for r in reservations} != quantities:
+        raise HTTPException(status_code=409, detail="Idempotency-Key was already used for a different request")
+    if reservations[0].status == RELEASED:
+        raise HTTPException(status_code=409, detail="Reservation already released")
+
+    result = await db.execute(select(Item.id, Item.quantity).where(Item.id.in_(quantities)))
+    remaining = dict(result.all())
+    return [
+        ReservationOut(
+            item_id=r.item_id,
+            qty=r.qty,
+            remaining=remaining.get(r.item_id, 0),
+            unit_price=r.unit_price,
+            total_price=r.unit_price * r.qty,
+            expires_at=None if r.status == COMMITTED else r.expires_at
+        )
+        for r in reservations
+    ]
+
+# Reserve stock atomically and return the unit price, so order_service needs a single call per order.
+# With an Idempotency-Key the stock is held as a reservation that must be committed or released.
+@router.post("/{item_id}/reserve", response_model=ReservationOut)
+async def reserve_item(
+    item_id: int,
+    data: QuantityUpdate,
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: str | None = Header(None)
+):
+    with RESERVATION_LATENCY.labels(kind="single").time():
+        if idempotency_key:
+            if data.qty < 1:
+                raise HTTPException(status_code=400, detail="Quantity must be positive")
+            [line] = await _reserve_with_key(db, idempotency_key, {item_id: data.qty}, "reserve")
+            return line
 
+        remaining, price = await _reserve_or_raise(db, item_id, data.qty, "reserve")
+    return ReservationOut(
+        item_id=item_id,
+        qty=data.qty,
+        remaining=remaining,
+        unit_price=price,
+        total_price=price * data.qty
+    )
+
+# Reserve every line of a cart in one transaction: either all lines are reserved or none is
+@router.post("/reserve-batch", response_model=BatchReservationOut)
+async def reserve_items_batch(
+    data: BatchReservationRequest,
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: str | None = Header(None)
+):
+    if not data.lines:
+        raise HTTPException(status_code=400, detail="No lines to reserve")
+    # Merge duplicate lines for the same item
+    quantities: dict[int, int] = {}
+    for line in data.lines:
+        if line.qty < 1:
+            raise HTTPException(status_code=400, detail="Quantity must be positive")
+        quantities[line.item_id] = quantities.get(line.item_id, 0) + line.qty
+
+    with RESERVATION_LATENCY.labels(kind="batch").time():
+        if idempotency_key:
+            lines = await _reserve_with_key(db, idempotency_key, quantities, "reserve-batch")
+            return BatchReservationOut(lines=lines, total_price=sum(line.total_price for line in lines))
+
+        items, missing, short = await reserve_stock_batch(db, quantities)
+    if missing:
+        raise HTTPException(status_code=404, detail={"message": "Item not found", "item_ids": missing})
+    if short:
+        OUT_OF_STOCK_REJECTIONS.labels(endpoint="reserve-batch").inc()
+        raise HTTPException(status_code=400, detail={"message": "Out of Stock", "item_ids": short})
+    STOCK_RESERVED.inc(sum(quantities.values()))
+
+    lines = [
+        ReservationOut(
+            item_id=item.id,
+            qty=quantities[item.id],
+            remaining=item.quantity,
+            unit_price=item.price,
+            total_price=item.price * quantities[item.id]
+        )
+        for item in items
+    ]
+    return BatchReservationOut(lines=lines, total_price=sum(line.total_price for line in lines))
+
+# Saga steps for order_service: commit once the order is stored, release to compensate a failed order
+@router.post("/reservations/{key}/commit", response_model=ReservationStatusOut)
+async def commit_item_reservation(key: str, db: AsyncSession = Depends(get_db)):
+    reservations = await commit_reservation(db, key)
+    if not reservations:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    if reservations[0].status != COMMITTED:
+        raise HTTPException(status_code=409, detail="Reservation already released")
+    return ReservationStatusOut(idempotency_key=key, status=COMMITTED)
+
+@router.post("/reservations/{key}/release", response_model=ReservationStatusOut)
+async def release_item_reservation(key: str, db: AsyncSession = Depends(get_db)):
+    reservations = await release_reservation(db, key)
+    if not reservations:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    if reservations[0].status != RELEASED:
+        raise HTTPException(status_code=409, detail="Reservation already committed")
+    logger.info("Reservation released", extra={"key": key})
+    return ReservationStatusOut(idempotency_key=key, status=RELEASED)
 
 @router.put("/{item_id}/decrease")
 async def decrease_quantity(item_id: int, data: QuantityUpdate, db: AsyncSession = Depends(get_db)):
-    item = await get_item_by_id(db, item_id)
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
-    if item.quantity < data.qty:
-        raise HTTPException(status_code=400, detail="Out of Stock")
-    item.quantity -= data.qty
-    await db.commit()
-    return {"message": "Quantity decreased", "remaining": item.quantity}
+    remaining, _ = await _reserve_or_raise(db, item_id, data.qty, "decrease")
+    return {"message": "Quantity decreased", "remaining": remaining}
     
 @router.put("/{item_id}/increase")
 async def increase_quantity(item_id: int, data: QuantityUpdate, db: AsyncSession = Depends(get_db)):
-    item = await get_item_by_id(db, item_id)
-    if not item:
+    row = await release_stock(db, item_id, data.qty)
+    if row is None:
         raise HTTPException(status_code=404, detail="Item not found")
-    item.quantity += data.qty
-    await db.commit()
-    return {"message": "Quantity increased", "current": item.quantity}
\ No newline at end of file
+    STOCK_RELEASED.labels(reason="restock").inc(data.qty)
+    return {"message": "Quantity increased", "current": row.quantity}
\ No newline at end of file
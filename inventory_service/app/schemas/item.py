@@ -1,3 +1,4 @@
+from datetime import datetime
 from pydantic import BaseModel
 
 class ItemBase(BaseModel):
@@ -18,6 +19,30 @@ class ItemUpdate(BaseModel):
     
 class QuantityUpdate(BaseModel):
     qty: int
+
+class ReservationOut(BaseModel):
+    item_id: int
+    qty: int
+    remaining: int
+    unit_price: float
+    total_price: float
+    # Only set for reservations made with an Idempotency-Key, they must be committed before this
+    expires_at: datetime | None = None
+
+class ReservationLine(BaseModel):
+    item_id: int
+    qty: int
+
+class BatchReservationRequest(BaseModel):
+    lines: list[ReservationLine]
+
+class BatchReservationOut(BaseModel):
+    lines: list[ReservationOut]
+    total_price: float
+
+class ReservationStatusOut(BaseModel):
+    idempotency_key: str
+    status: str
     
 class ItemOut(ItemBase):
     id: int
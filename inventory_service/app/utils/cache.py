@@ -0,0 +1,142 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from app.utils.metrics import CACHE_REQUESTS
+
+# "memory" (per-process LRU, default), "redis" (shared, needs the redis package) or "none"
+ITEM_CACHE_BACKEND = os.getenv("ITEM_CACHE_BACKEND", "memory")
+ITEM_CACHE_SIZE = int(os.getenv("ITEM_CACHE_SIZE", 10000))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+class MemoryCache:
+    """In-process LRU with a TTL per entry"""
+
+    def __init__(self, maxsize: int = ITEM_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        # Counters never expire and are never evicted
+        self._counters: dict[str, int] = {}
+
+    async def get_many(self, *keys: str) -> list[str | None]:
+        now = time.monotonic()
+        values = []
+        for key in keys:
+            if key in self._counters:
+                values.append(str(self._counters[key]))
+                continue
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+            values.append(entry[1] if entry else None)
+        return values
+
+    async def set(self, key: str, value: str, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def set_many(self, values: dict[str, str], ttl: float):
+        for key, value in values.items():
+            await self.set(key, value, ttl)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def incr(self, key: str) -> int:
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+
+class RedisCache:
+    """Shared cache over anything speaking the redis.asyncio API (a real server, or a local fake in tests)"""
+
+    def __init__(self, client=None, url: str = REDIS_URL, prefix: str = "inventory:"):
+        if client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError as e:
+                raise RuntimeError("ITEM_CACHE_BACKEND=redis needs the 'redis' package") from e
+            client = redis.from_url(url, decode_responses=True)
+        self.client = client
+        self.prefix = prefix
+
+    async def get_many(self, *keys: str) -> list[str | None]:
+        values = await self.client.mget([self.prefix + key for key in keys])
+        return [value.decode() if isinstance(value, bytes) else value for value in values]
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self.client.set(self.prefix + key, value, px=max(int(ttl * 1000), 1))
+
+    async def set_many(self, values: dict[str, str], ttl: float):
+        # One round trip for a whole page of items
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, value in values.items():
+                pipe.set(self.prefix + key, value, px=max(int(ttl * 1000), 1))
+            await pipe.execute()
+
+    async def delete(self, *keys: str):
+        await self.client.delete(*[self.prefix + key for key in keys])
+
+    async def incr(self, key: str) -> int:
+        return await self.client.incr(self.prefix + key)
+
+class NullCache:
+    """Caching switched off: every lookup is a miss"""
+
+    async def get_many(self, *keys: str) -> list[str | None]:
+        return [None] * len(keys)
+
+    async def set(self, key: str, value: str, ttl: float):
+        pass
+
+    async def set_many(self, values: dict[str, str], ttl: float):
+        pass
+
+    async def delete(self, *keys: str):
+        pass
+
+    async def incr(self, key: str) -> int:
+        return 0
+
+def build_cache(backend: str = ITEM_CACHE_BACKEND):
+    if backend == "redis":
+        return RedisCache()
+    if backend == "none":
+        return NullCache()
+    return MemoryCache()
+
+item_cache = build_cache()
+
+CATALOG_GENERATION_KEY = "catalog:generation"
+
+async def cache_get(*keys: str) -> list:
+    """Look up JSON values. Hits/misses are counted per key prefix ("item", "stock", "catalog")."""
+    values = await item_cache.get_many(*keys)
+    for key, value in zip(keys, values):
+        CACHE_REQUESTS.labels(cache=key.split(":", 1)[0], result="miss" if value is None else "hit").inc()
+    return [None if value is None else json.loads(value) for value in values]
+
+async def cache_set_many(values: dict, ttl: float):
+    await item_cache.set_many(
+        {key: json.dumps(value, separators=(",", ":")) for key, value in values.items()}, ttl
+    )
+
+async def get_catalog_generation() -> int:
+    [generation] = await item_cache.get_many(CATALOG_GENERATION_KEY)
+    return int(generation or 0)
+
+async def invalidate_item(*item_ids: int, metadata: bool = False):
+    """Drop cached stock of items. With metadata=True (created/edited/deleted items) also drop
+    their cached rows and start a new catalog generation, so cached listings are rebuilt."""
+    keys = [f"stock:{item_id}" for item_id in item_ids]
+    if metadata:
+        keys += [f"item:{item_id}" for item_id in item_ids]
+    if keys:
+        await item_cache.delete(*keys)
+    if metadata:
+        await item_cache.incr(CATALOG_GENERATION_KEY)
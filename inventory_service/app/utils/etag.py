@@ -0,0 +1,23 @@
+import hashlib
+
+# Strong ETags for item and catalog responses, derived from the items' version column
+
+def item_etag(item: dict) -> str:
+    return f'"{item["id"]}.{item["version"]}"'
+
+def catalog_etag(items: list[dict], *extra) -> str:
+    """ETag of a catalog page: changes whenever a row on it changes, or the page's composition does"""
+    digest = hashlib.sha1()
+    for item in items:
+        digest.update(f"{item['id']}.{item['version']},".encode())
+    for part in extra:
+        digest.update(f"|{part}".encode())
+    return f'"{digest.hexdigest()}"'
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match check: a list of tags or "*" (weak tags compare by their opaque part)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
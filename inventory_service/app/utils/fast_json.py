@@ -0,0 +1,83 @@
+import logging
+import os
+import types
+import typing
+from functools import lru_cache
+from operator import attrgetter, itemgetter
+from fastapi import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # Optional: without it list endpoints use the response_model path
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Encode list endpoints straight from the rows with orjson, skipping response_model validation
+# of data we just read from our own database. Needs orjson; "false" restores the plain path.
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "true").lower() in ("1", "true", "yes")
+
+def fast_json_enabled() -> bool:
+    return FAST_JSON_RESPONSES and orjson is not None
+
+def _list_model(annotation):
+    """The model of a list[Model] field, else None"""
+    if typing.get_origin(annotation) is list:
+        [arg] = typing.get_args(annotation) or [None]
+        if isinstance(arg, type) and issubclass(arg, BaseModel):
+            return arg
+    return None
+
+def _is_float(annotation) -> bool:
+    """float or float | None"""
+    if typing.get_origin(annotation) in (typing.Union, types.UnionType):
+        return float in typing.get_args(annotation)
+    return annotation is float
+
+@lru_cache(maxsize=None)
+def row_encoder(model: type[BaseModel]):
+    """Function turning an ORM row or dict into a plain dict of `model`'s fields.
+    The field names, getters and conversions are worked out once per model."""
+    names = tuple(model.model_fields)
+    get_attrs, get_items = attrgetter(*names), itemgetter(*names)
+    if len(names) == 1:
+        # With a single name the getters return the bare value, not a tuple
+        get_attrs = lambda row, get=get_attrs: (get(row),)  # noqa: E731
+        get_items = lambda row, get=get_items: (get(row),)  # noqa: E731
+    nested = [
+        (name, row_encoder(sub)) for name, field in model.model_fields.items()
+        if (sub := _list_model(field.annotation)) is not None
+    ]
+    # Float columns can come back as ints (SQLite); pydantic would emit 2.0, not 2
+    floats = [name for name, field in model.model_fields.items() if _is_float(field.annotation)]
+
+    def encode(row) -> dict:
+        values = dict(zip(names, get_items(row) if isinstance(row, dict) else get_attrs(row)))
+        for name in floats:
+            if values[name] is not None:
+                values[name] = float(values[name])
+        for name, encode_nested in nested:
+            values[name] = [encode_nested(child) for child in values[name] or ()]
+        return values
+
+    return encode
+
+def dumps_row(row, model: type[BaseModel]) -> bytes:
+    """One row as JSON bytes, for streamed exports"""
+    if fast_json_enabled():
+        return orjson.dumps(row_encoder(model)(row), option=orjson.OPT_UTC_Z)
+    return model.model_validate(row, from_attributes=True).model_dump_json().encode()
+
+def json_rows_response(rows, model: type[BaseModel], headers=None) -> Response | None:
+    """`rows` as a JSON array response, or None when the fast path is off or can't encode them:
+    the endpoint then returns the rows and FastAPI serialises them through response_model"""
+    if not fast_json_enabled():
+        return None
+    encode = row_encoder(model)
+    try:
+        body = orjson.dumps([encode(row) for row in rows], option=orjson.OPT_UTC_Z)
+    except (orjson.JSONEncodeError, AttributeError, KeyError):
+        logger.warning("Fast JSON encoding of %s failed, using response_model", model.__name__, exc_info=True)
+        return None
+    return Response(body, media_type="application/json", headers=dict(headers or {}))
@@ -1,12 +1,82 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
+from app.utils.tracing import TraceContextFilter
 import sys
 
+# Handlers run on a background thread fed by a queue, so a slow disk never blocks the event loop
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" or "text"
+LOG_FILE = os.getenv("LOG_FILE", "")  # rotated log file, empty for stdout only
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# Share of the records logged with extra={"sampled": True} (high-volume info lines) that are kept
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 0.1))
+
+# Attributes every LogRecord has, anything else came in through extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "sampled"}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the fields passed as extra= at the top level"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRS)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Keeps LOG_SAMPLE_RATE of the records marked sampled, everything else passes"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not getattr(record, "sampled", False) or random.random() < LOG_SAMPLE_RATE
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Drops records instead of raising when the writer thread falls behind"""
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def _build_handlers() -> list[logging.Handler]:
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(
+        "[%(asctime)s] %(levelname)s in %(module)s: %(message)s"
+    )
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if LOG_FILE:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+queue_handler = DroppingQueueHandler(_queue)
+# Only merges args into the message before the record crosses threads, real formatting happens on the writer
+queue_handler.setFormatter(logging.Formatter("%(message)s"))
+queue_handler.addFilter(SamplingFilter())
+queue_handler.addFilter(TraceContextFilter())
+listener = logging.handlers.QueueListener(_queue, *_build_handlers(), respect_handler_level=True)
+listener.start()
+# Flush what is still queued on shutdown
+atexit.register(listener.stop)
+
 logger = logging.getLogger("inventory_logger")
-logger.setLevel(logging.INFO)
-
-handler = logging.StreamHandler(sys.stdout)
-formatter = logging.Formatter(
-    "[%(asctime)s] %(levelname)s in %(module)s: %(message)s"
-)
-handler.setFormatter(formatter)
-logger.addHandler(handler)
\ No newline at end of file
+logger.setLevel(LOG_LEVEL)
+logger.addHandler(queue_handler)
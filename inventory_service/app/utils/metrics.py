@@ -1,6 +1,6 @@
 # app/utils/metrics.py
-from fastapi import Request, Response
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from fastapi import Response
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 import time
 import re
 
@@ -18,6 +18,111 @@ REQUEST_LATENCY = Histogram(
     buckets=[0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0]
 )
 
+# Decoded-JWT cache in app/auth/token_cache.py
+TOKEN_CACHE_HITS = Counter(
+    "auth_token_cache_hits_total",
+    "Bearer tokens served from the decoded-claims cache"
+)
+
+TOKEN_CACHE_MISSES = Counter(
+    "auth_token_cache_misses_total",
+    "Bearer tokens that had to be verified and decoded"
+)
+
+# Read-through item/catalog cache in app/utils/cache.py; hit ratio = hits / (hits + misses)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by cache and result (hit/miss)",
+    ["cache", "result"]
+)
+
+# Business metrics, recorded by the item routes and reservation CRUD (HTTP metrics come from the middleware only)
+ITEMS_CREATED = Counter(
+    "inventory_items_created_total",
+    "Items created by admins"
+)
+
+STOCK_RESERVED = Counter(
+    "inventory_stock_reserved_units_total",
+    "Units of stock taken by reservations and decreases"
+)
+
+STOCK_RELEASED = Counter(
+    "inventory_stock_released_units_total",
+    "Units of stock put back, by reason (release, expired, restock)",
+    ["reason"]
+)
+
+OUT_OF_STOCK_REJECTIONS = Counter(
+    "inventory_out_of_stock_rejections_total",
+    "Reservations refused for lack of stock",
+    ["endpoint"]
+)
+
+RESERVATION_LATENCY = Histogram(
+    "inventory_reservation_duration_seconds",
+    "Time to reserve stock, by kind (single, batch)",
+    ["kind"],
+    buckets=[0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+)
+
+# Stock-change events (app/utils/stock_events.py)
+STOCK_EVENTS_PUBLISHED = Counter(
+    "inventory_stock_events_published_total",
+    "Stock-change events handed to the transport",
+    ["transport"]
+)
+
+STOCK_EVENTS_FAILED = Counter(
+    "inventory_stock_events_failed_total",
+    "Stock-change events the transport could not deliver (retried with the next flush) or dropped",
+    ["transport", "result"]
+)
+
+# Database connection pool (app/db/engine.py)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_seconds",
+    "Time spent waiting for a pooled database connection",
+    buckets=[0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0]
+)
+
+DB_POOL_WAITING = Gauge(
+    "db_pool_checkouts_waiting",
+    "Requests currently waiting for a database connection"
+)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "Database connections currently in use"
+)
+
+DB_POOL_CAPACITY = Gauge(
+    "db_pool_max_connections",
+    "Configured pool_size + max_overflow"
+)
+
+# SQL statements (app/db/instrumentation.py), labelled by statement template id, see /debug/sql-stats
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "Latency of SQL statements by template",
+    ["statement"],
+    buckets=[0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0]
+)
+
+DB_QUERY_ROWS = Histogram(
+    "db_query_rows",
+    "Rows returned or affected by SQL statements by template",
+    ["statement"],
+    buckets=[0, 1, 5, 10, 50, 100, 500, 1000, 5000]
+)
+
+DB_STATEMENTS_PER_REQUEST = Histogram(
+    "db_statements_per_request",
+    "SQL statements run while serving one HTTP request",
+    ["path"],
+    buckets=[0, 1, 2, 3, 5, 10, 20, 50, 100]
+)
+
 def sanitize_path(path: str) -> str:
     """Convert URL paths to consistent metric-friendly format"""
     # Replace all numbers with {id}
@@ -28,39 +133,55 @@ def sanitize_path(path: str) -> str:
     path = path.rstrip("/")
     return path or "/"
 
-async def metrics_middleware(request: Request, call_next):
-    start_time = time.time()
-    response = None
-    status_code = 500  # Default to 500 if something fails
-    
-    try:
-        response = await call_next(request)
-        status_code = response.status_code
-    except Exception as e:
-        # Create a response object if none exists
-        if response is None:
-            response = Response(
-                content="Internal Server Error",
-                status_code=status_code
-            )
-        raise e
-    finally:
-        process_time = time.time() - start_time
-        sanitized_path = sanitize_path(request.url.path)
-        
-        # Safe metric recording (response is guaranteed to exist)
-        REQUEST_LATENCY.labels(
-            method=request.method.lower(),
-            path=sanitized_path
-        ).observe(process_time)
-        
-        REQUEST_COUNT.labels(
-            method=request.method.lower(),
-            path=sanitized_path,
-            status_code=str(status_code)    # Use the pre-defined status_code
-        ).inc()
-
-    return response
+class PrometheusMiddleware:
+    """Raw ASGI middleware recording REQUEST_COUNT/REQUEST_LATENCY.
+
+    Requests are labelled with the template of the route the router matched ("/items/{item_id}"),
+    so nothing is rewritten per request and unknown paths all share the "unmatched" label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        # (method, path, status) -> bound label children, skips the .labels() lookup on hot paths
+        self._counters = {}
+        self._histograms = {}
+
+    def _counter(self, method: str, path: str, status_code: int):
+        key = (method, path, status_code)
+        child = self._counters.get(key)
+        if child is None:
+            child = self._counters[key] = REQUEST_COUNT.labels(method=method, path=path, status_code=str(status_code))
+        return child
+
+    def _histogram(self, method: str, path: str):
+        key = (method, path)
+        child = self._histograms.get(key)
+        if child is None:
+            child = self._histograms[key] = REQUEST_LATENCY.labels(method=method, path=path)
+        return child
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500  # Stays 500 if the app fails before starting a response
+        start_time = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"].lower()
+            self._histogram(method, path).observe(time.perf_counter() - start_time)
+            self._counter(method, path, status_code).inc()
 
 def metrics_endpoint():
     async def handler():
@@ -0,0 +1,20 @@
+import asyncio
+import os
+from app.db.database import AsyncSessionLocal
+from app.crud.reservation import release_expired_reservations
+from app.utils.logger import logger
+
+RESERVATION_SWEEP_INTERVAL = float(os.getenv("RESERVATION_SWEEP_INTERVAL", 30))
+
+async def run_reservation_sweeper(interval: float = RESERVATION_SWEEP_INTERVAL):
+    """Background task: periodically release reservations whose TTL has expired"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with AsyncSessionLocal() as db:
+                released = await release_expired_reservations(db)
+            if released:
+                logger.info("Released expired reservations", extra={"count": released})
+        except Exception:
+            # Keep sweeping, a transient DB error must not kill the task
+            logger.exception("Reservation sweep failed")
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+import time
+from sqlalchemy import text
+from sqlalchemy.future import select
+from app.db.database import AsyncSessionLocal, engine
+from app.models.item import Item
+from app.utils.logger import logger
+from app.utils.metrics import STOCK_EVENTS_PUBLISHED, STOCK_EVENTS_FAILED
+
+# Where stock-change events go: "none" (default), "memory" (in-process subscribers),
+# "postgres" (NOTIFY on STOCK_EVENTS_CHANNEL, for LISTENers on the inventory database)
+# or "http" (POSTed to STOCK_EVENTS_URL, e.g. order_service's /internal/stock-events)
+STOCK_EVENTS_TRANSPORT = os.getenv("STOCK_EVENTS_TRANSPORT", "none")
+STOCK_EVENTS_CHANNEL = os.getenv("STOCK_EVENTS_CHANNEL", "stock_events")
+STOCK_EVENTS_URL = os.getenv("STOCK_EVENTS_URL", "http://localhost:8002/internal/stock-events")
+STOCK_EVENTS_TOKEN = os.getenv("STOCK_EVENTS_TOKEN", "")
+# Changes within this window are coalesced, an item sold 50 times in it is published once
+STOCK_EVENTS_FLUSH_INTERVAL = float(os.getenv("STOCK_EVENTS_FLUSH_INTERVAL", 0.05))
+STOCK_EVENTS_RETRY_DELAY = float(os.getenv("STOCK_EVENTS_RETRY_DELAY", 1.0))
+STOCK_EVENTS_BATCH_SIZE = 500
+# NOTIFY payloads are limited to 8000 bytes
+NOTIFY_EVENTS_PER_PAYLOAD = 50
+
+class NullTransport:
+    """Events switched off"""
+    name = "none"
+
+    async def send(self, events: list[dict]):
+        pass
+
+class MemoryTransport:
+    """In-process fan-out: every subscriber gets its own queue of event batches.
+    A subscriber that falls behind loses batches instead of blocking the publisher."""
+    name = "memory"
+
+    def __init__(self):
+        self.subscribers: list[asyncio.Queue] = []
+
+    def subscribe(self, maxsize: int = 1000) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.remove(queue)
+
+    async def send(self, events: list[dict]):
+        for queue in self.subscribers:
+            try:
+                queue.put_nowait(events)
+            except asyncio.QueueFull:
+                STOCK_EVENTS_FAILED.labels(transport=self.name, result="dropped").inc(len(events))
+
+class PostgresTransport:
+    """NOTIFY through the service's own engine, so it needs Postgres as the inventory database"""
+    name = "postgres"
+
+    def __init__(self, channel: str = STOCK_EVENTS_CHANNEL):
+        self.channel = channel
+
+    async def send(self, events: list[dict]):
+        async with engine.connect() as conn:
+            for start in range(0, len(events), NOTIFY_EVENTS_PER_PAYLOAD):
+                payload = json.dumps(events[start:start + NOTIFY_EVENTS_PER_PAYLOAD], separators=(",", ":"))
+                await conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": payload})
+            # Notifications are delivered when the transaction commits
+            await conn.commit()
+
+class HttpTransport:
+    """POST batches to a webhook; stands in for a message broker"""
+    name = "http"
+
+    def __init__(self, url: str = STOCK_EVENTS_URL, token: str = STOCK_EVENTS_TOKEN):
+        import httpx
+        self.url = url
+        self.client = httpx.AsyncClient(
+            timeout=2.0, headers={"X-Stock-Events-Token": token} if token else None
+        )
+
+    async def send(self, events: list[dict]):
+        response = await self.client.post(self.url, json={"events": events})
+        response.raise_for_status()
+
+def build_transport(name: str = STOCK_EVENTS_TRANSPORT):
+    if name == "memory":
+        return MemoryTransport()
+    if name == "postgres":
+        return PostgresTransport()
+    if name == "http":
+        return HttpTransport()
+    return NullTransport()
+
+transport = build_transport()
+
+# Items changed since the last flush
+_pending: set[int] = set()
+_changed = asyncio.Event()
+
+def stock_changed(*item_ids: int):
+    """Mark items whose stock, price or existence changed. Call after the change is committed;
+    the publisher reads the committed rows, so events never carry uncommitted values."""
+    if isinstance(transport, NullTransport) or not item_ids:
+        return
+    _pending.update(item_ids)
+    _changed.set()
+
+async def run_stock_event_publisher(interval: float = STOCK_EVENTS_FLUSH_INTERVAL):
+    """Background task: publish the current quantity, price and version of changed items"""
+    if isinstance(transport, NullTransport):
+        return
+    while True:
+        await _changed.wait()
+        await asyncio.sleep(interval)
+        _changed.clear()
+        item_ids = sorted(_pending)
+        _pending.clear()
+        try:
+            await _publish(item_ids)
+        except Exception:
+            logger.exception("Could not publish stock events")
+            STOCK_EVENTS_FAILED.labels(transport=transport.name, result="retried").inc(len(item_ids))
+            # Publish them again with the next flush, with whatever their state is by then
+            _pending.update(item_ids)
+            _changed.set()
+            await asyncio.sleep(STOCK_EVENTS_RETRY_DELAY)
+
+async def _publish(item_ids: list[int]):
+    for start in range(0, len(item_ids), STOCK_EVENTS_BATCH_SIZE):
+        chunk = item_ids[start:start + STOCK_EVENTS_BATCH_SIZE]
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Item.id, Item.quantity, Item.price, Item.version).where(Item.id.in_(chunk))
+            )
+            rows = {row.id: row for row in result}
+        now = time.time()
+        events = []
+        for item_id in chunk:
+            row = rows.get(item_id)
+            if row is None:
+                events.append({"item_id": item_id, "deleted": True, "ts": now})
+            else:
+                events.append({
+                    "item_id": item_id, "quantity": row.quantity, "price": row.price,
+                    "version": row.version, "ts": now
+                })
+        await transport.send(events)
+        STOCK_EVENTS_PUBLISHED.labels(transport=transport.name).inc(len(events))
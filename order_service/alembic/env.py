@@ -6,6 +6,8 @@ from sqlalchemy.ext.asyncio import async_engine_from_config
 
 from alembic import context
 from app.db.database import Base  # Your Base for target_metadata
+from app.models import order  # Import your models
+from app.models import outbox
 
 # Alembic Config object, gives access to .ini file settings
 config = context.config
@@ -0,0 +1,45 @@
+"""add order lines
+
+Revision ID: 4c1d2e9a7b30
+Revises: bba48b8ec014
+Create Date: 2026-10-18 12:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c1d2e9a7b30'
+down_revision: Union[str, Sequence[str], None] = 'bba48b8ec014'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('order_lines',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('unit_price', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_order_lines_id'), 'order_lines', ['id'], unique=False)
+    op.create_index(op.f('ix_order_lines_order_id'), 'order_lines', ['order_id'], unique=False)
+    # Cart orders keep their items in order_lines, so the header columns become optional
+    op.alter_column('orders', 'item_id', existing_type=sa.Integer(), nullable=True)
+    op.alter_column('orders', 'quantity', existing_type=sa.Integer(), nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column('orders', 'quantity', existing_type=sa.Integer(), nullable=False)
+    op.alter_column('orders', 'item_id', existing_type=sa.Integer(), nullable=False)
+    op.drop_index(op.f('ix_order_lines_order_id'), table_name='order_lines')
+    op.drop_index(op.f('ix_order_lines_id'), table_name='order_lines')
+    op.drop_table('order_lines')
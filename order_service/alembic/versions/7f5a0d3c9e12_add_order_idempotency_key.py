@@ -0,0 +1,30 @@
+"""add order idempotency key
+
+Revision ID: 7f5a0d3c9e12
+Revises: 4c1d2e9a7b30
+Create Date: 2026-10-18 13:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f5a0d3c9e12'
+down_revision: Union[str, Sequence[str], None] = '4c1d2e9a7b30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('orders', sa.Column('idempotency_key', sa.String(length=100), nullable=True))
+    op.create_unique_constraint('uq_orders_idempotency_key', 'orders', ['idempotency_key'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_orders_idempotency_key', 'orders', type_='unique')
+    op.drop_column('orders', 'idempotency_key')
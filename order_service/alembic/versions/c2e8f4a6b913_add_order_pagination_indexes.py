@@ -0,0 +1,32 @@
+"""add order pagination indexes
+
+Revision ID: c2e8f4a6b913
+Revises: 7f5a0d3c9e12
+Create Date: 2026-10-18 13:45:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2e8f4a6b913'
+down_revision: Union[str, Sequence[str], None] = '7f5a0d3c9e12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_orders_user_id_id', 'orders', ['user_id', 'id'], unique=False)
+    op.create_index('ix_orders_status_id', 'orders', ['status', 'id'], unique=False)
+    op.create_index(op.f('ix_order_lines_item_id'), 'order_lines', ['item_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_order_lines_item_id'), table_name='order_lines')
+    op.drop_index('ix_orders_status_id', table_name='orders')
+    op.drop_index('ix_orders_user_id_id', table_name='orders')
@@ -1,7 +1,8 @@
 from datetime import datetime, timedelta
-from jose import jwt, JWTError
+from jose import JWTError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from app.auth.token_cache import decode_token
 import os
 from dotenv import load_dotenv
 
@@ -19,7 +20,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token, SECRET_KEY, ALGORITHM)
         user_id: int = payload.get("user_id")
         role: str = payload.get("role")
         if user_id is None or role is None:
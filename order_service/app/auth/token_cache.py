@@ -0,0 +1,67 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from jose import jwt
+from app.utils.metrics import TOKEN_CACHE_HITS, TOKEN_CACHE_MISSES
+
+# Clients reuse one bearer token for many requests, so verified claims are kept for a while
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+# Upper bound for how long a decoded token is trusted without verifying it again
+TOKEN_CACHE_MAX_TTL = float(os.getenv("TOKEN_CACHE_MAX_TTL", 300))
+
+class TokenCache:
+    """Bounded LRU of decoded JWT claims, keyed by a hash of the token.
+    An entry never outlives the token's own "exp" claim."""
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE, max_ttl: float = TOKEN_CACHE_MAX_TTL):
+        self.maxsize = maxsize
+        self.max_ttl = max_ttl
+        self._entries: OrderedDict[bytes, tuple[float, dict]] = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        # Don't keep raw tokens in memory
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> dict | None:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, claims = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return claims
+
+    def put(self, token: str, claims: dict):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.time() + self.max_ttl
+        exp = claims.get("exp")
+        if isinstance(exp, (int, float)):
+            expires_at = min(expires_at, exp)
+        key = self._key(token)
+        self._entries[key] = (expires_at, claims)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+token_cache = TokenCache()
+
+def decode_token(token: str, secret_key: str, algorithm: str) -> dict:
+    """jwt.decode with a cache in front. Raises JWTError like jwt.decode.
+    The returned claims dict is shared between requests, don't modify it."""
+    claims = token_cache.get(token)
+    if claims is not None:
+        TOKEN_CACHE_HITS.inc()
+        return claims
+    TOKEN_CACHE_MISSES.inc()
+    claims = jwt.decode(token, secret_key, algorithms=[algorithm])
+    token_cache.put(token, claims)
+    return claims
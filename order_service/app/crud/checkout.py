@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.models.order import Order, OrderLine, CONFIRMED, REJECTED
+from app.models.outbox import OrderOutbox, QUEUED, PROCESSING, DONE
+
+async def create_checkout_order(
+    db: AsyncSession,
+    user_id: int,
+    idempotency_key: str,
+    item_id: int | None = None,
+    quantity: int | None = None,
+    lines: list[tuple[int, int]] | None = None,
+    prices: dict[int, float | None] | None = None
+):
+    """Accept an order without touching inventory: the pending order and its outbox row commit together.
+    `prices` (item_id -> unit price, from the stock projection) are provisional, the checkout worker
+    replaces them with the reserved prices; unknown prices count as 0 until then."""
+    prices = {item: price for item, price in (prices or {}).items() if price is not None}
+    order_lines = [
+        OrderLine(item_id=line_item, quantity=qty, unit_price=prices.get(line_item, 0.0)) for line_item, qty in lines or []
+    ]
+    if order_lines:
+        total_price = sum(line.unit_price * line.quantity for line in order_lines)
+    else:
+        total_price = prices.get(item_id, 0.0) * quantity
+    new_order = Order(
+        user_id=user_id,
+        item_id=item_id,
+        quantity=quantity,
+        total_price=total_price,
+        idempotency_key=idempotency_key,
+        lines=order_lines
+    )
+    db.add(new_order)
+    await db.flush()
+    db.add(OrderOutbox(order_id=new_order.id, available_at=datetime.now(timezone.utc)))
+    await db.commit()
+    await db.refresh(new_order)
+    return new_order
+
+async def claim_checkout_batch(db: AsyncSession, limit: int, claim_timeout: float) -> list[tuple[OrderOutbox, Order]]:
+    """Claim up to `limit` due outbox rows, oldest first. Rows claimed by a worker that died
+    are claimed again after `claim_timeout` seconds (reservations are idempotent, so that is safe)."""
+    now = datetime.now(timezone.utc)
+    result = await db.execute(
+        select(OrderOutbox)
+        .where(or_(
+            and_(OrderOutbox.status == QUEUED, OrderOutbox.available_at <= now),
+            and_(OrderOutbox.status == PROCESSING, OrderOutbox.claimed_at < now - timedelta(seconds=claim_timeout))
+        ))
+        .order_by(OrderOutbox.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    entries = result.scalars().all()
+    if not entries:
+        await db.commit()
+        return []
+    for entry in entries:
+        entry.status = PROCESSING
+        entry.claimed_at = now
+        entry.attempts += 1
+    orders = await db.execute(select(Order).where(Order.id.in_([entry.order_id for entry in entries])))
+    by_id = {order.id: order for order in orders.scalars().all()}
+    await db.commit()
+    return [(entry, by_id[entry.order_id]) for entry in entries if entry.order_id in by_id]
+
+async def confirm_checkout_order(db: AsyncSession, order_id: int, reservation: dict):
+    """Copy the reserved prices onto the order and mark it confirmed"""
+    order = await db.get(Order, order_id)
+    order.total_price = reservation["total_price"]
+    prices = {line["item_id"]: line["unit_price"] for line in reservation.get("lines", [])}
+    for line in order.lines:
+        line.unit_price = prices.get(line.item_id, line.unit_price)
+    order.status = CONFIRMED
+    await _finish_outbox(db, order_id, DONE)
+    await db.commit()
+
+async def reject_checkout_order(db: AsyncSession, order_id: int, reason: str):
+    order = await db.get(Order, order_id)
+    order.status = REJECTED
+    await _finish_outbox(db, order_id, DONE, reason)
+    await db.commit()
+
+async def retry_checkout_order(db: AsyncSession, order_id: int, reason: str, delay: float):
+    """Put the outbox row back in the queue, due again after `delay` seconds"""
+    await _finish_outbox(db, order_id, QUEUED, reason, datetime.now(timezone.utc) + timedelta(seconds=delay))
+    await db.commit()
+
+async def queue_reservation_commit(db: AsyncSession, order_id: int, reason: str, delay: float = 1.0):
+    """Hand a confirmed order whose reservation commit failed to the checkout workers, which retry
+    the commit until it lands or inventory reports the reservation expired"""
+    result = await db.execute(select(OrderOutbox).where(OrderOutbox.order_id == order_id))
+    entry = result.scalar_one_or_none()
+    if entry is None:
+        # Synchronous orders have no outbox row yet
+        entry = OrderOutbox(order_id=order_id)
+        db.add(entry)
+    entry.status = QUEUED
+    entry.last_error = reason[:255]
+    entry.available_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+    await db.commit()
+
+async def finish_reservation_commit(db: AsyncSession, order_id: int, reason: str | None = None):
+    await _finish_outbox(db, order_id, DONE, reason)
+    await db.commit()
+
+async def _finish_outbox(db: AsyncSession, order_id: int, status: str, reason: str | None = None,
+                         available_at: datetime | None = None):
+    result = await db.execute(select(OrderOutbox).where(OrderOutbox.order_id == order_id))
+    entry = result.scalar_one()
+    entry.status = status
+    entry.last_error = reason[:255] if reason else None
+    if available_at is not None:
+        entry.available_at = available_at
+
+async def get_order_status(db: AsyncSession, order_id: int, user_id: int, role: str):
+    """(status, total_price) of an order visible to the caller, None if there is none"""
+    query = select(Order.status, Order.total_price).where(Order.id == order_id)
+    if role != "admin":
+        query = query.where(Order.user_id == user_id)
+    result = await db.execute(query)
+    return result.first()
@@ -1,23 +1,74 @@
+from sqlalchemy import or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from app.models.order import Order
+from app.db.database import AsyncSessionLocal
+from app.models.order import Order, OrderLine, CONFIRMED
 from app.schemas.order import OrderCreate, OrderUpdate
 from app.utils.service_clients import reduce_inventory, increase_inventory
 
-async def create_order(db: AsyncSession, order: OrderCreate):
-    new_order = Order(**order.dict())
+async def create_order(db: AsyncSession, order: OrderCreate, idempotency_key: str | None = None):
+    """Store an order whose stock is already reserved, so it is confirmed right away"""
+    new_order = Order(**order.dict(exclude={"status"}), status=CONFIRMED, idempotency_key=idempotency_key)
     db.add(new_order)
     await db.commit()
     await db.refresh(new_order)
     return new_order
 
-async def get_all_orders(db: AsyncSession, user_id: int, role: str):
-    if role == "admin":
-        result = await db.execute(select(Order))
-    else:
-        result = await db.execute(select(Order).where(Order.user_id == user_id))
+async def create_cart_order(db: AsyncSession, user_id: int, reservation: dict, idempotency_key: str | None = None):
+    """Create an order header plus one line per reserved item, confirmed like create_order"""
+    new_order = Order(
+        user_id=user_id,
+        total_price=reservation["total_price"],
+        status=CONFIRMED,
+        idempotency_key=idempotency_key,
+        lines=[
+            OrderLine(item_id=line["item_id"], quantity=line["qty"], unit_price=line["unit_price"])
+            for line in reservation["lines"]
+        ]
+    )
+    db.add(new_order)
+    await db.commit()
+    await db.refresh(new_order)
+    return new_order
+
+async def get_order_by_idempotency_key(db: AsyncSession, idempotency_key: str):
+    result = await db.execute(select(Order).where(Order.idempotency_key == idempotency_key))
+    return result.scalar_one_or_none()
+
+def _orders_query(user_id: int, role: str, status: str | None = None, item_id: int | None = None,
+                  owner_id: int | None = None, after: int | None = None):
+    """Orders visible to the caller, filtered and in keyset (id) order"""
+    query = select(Order).order_by(Order.id)
+    if role != "admin":
+        query = query.where(Order.user_id == user_id)
+    elif owner_id is not None:
+        query = query.where(Order.user_id == owner_id)
+    if status is not None:
+        query = query.where(Order.status == status)
+    if item_id is not None:
+        # Single-item orders carry item_id on the header, cart orders on their lines
+        query = query.where(or_(Order.item_id == item_id, Order.lines.any(OrderLine.item_id == item_id)))
+    if after is not None:
+        query = query.where(Order.id > after)
+    return query
+
+async def get_all_orders(db: AsyncSession, user_id: int, role: str, limit: int | None = None, **filters):
+    """One page of orders. `filters`: status, item_id, owner_id (admins only) and the `after` cursor."""
+    query = _orders_query(user_id, role, **filters)
+    if limit is not None:
+        query = query.limit(limit)
+    result = await db.execute(query)
     return result.scalars().all()
 
+async def stream_orders(user_id: int, role: str, batch_size: int = 500, **filters):
+    """Yield every matching order from a server-side cursor, `batch_size` rows in memory at a time.
+    Opens its own session, the request's session is closed before a streamed body is sent."""
+    query = _orders_query(user_id, role, **filters).execution_options(yield_per=batch_size)
+    async with AsyncSessionLocal() as session:
+        result = await session.stream_scalars(query)
+        async for order in result:
+            yield order
+
 async def get_order_by_id(db: AsyncSession, order_id: int, user_id: int, role: str):
     if role == "admin":
         result = await db.get(Order, order_id)
@@ -1,48 +1,46 @@
-from fastapi import FastAPI, Request, HTTPException
-from app.utils.metrics import REQUEST_COUNT, REQUEST_LATENCY, router
+from fastapi import FastAPI
+from app.utils.metrics import PrometheusMiddleware, router
 from app.routers.order import router as order_router
-import time
+from app.routers.debug import router as debug_router
+from app.routers.stock_events import router as stock_events_router
+from app.db.instrumentation import SQLStatsMiddleware
+from app.utils.profiler import track_task_ages
+from app.utils.tracing import TracingMiddleware
+from app.utils.service_clients import start_service_clients, close_service_clients
+from app.utils.checkout_worker import run_checkout_workers
+from app.utils.stock_projection import run_stock_projection, check_stock_projection_config
+from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    check_stock_projection_config()
+    # Creation times of tasks, for the ages in /debug/tasks
+    track_task_ages()
+    # Pooled HTTP clients to user/inventory services live for the whole process
+    await start_service_clients()
+    # Drains the checkout outbox (orders accepted with 202)
+    checkout = asyncio.create_task(run_checkout_workers())
+    # Local copy of inventory's stock and prices, fed by stock events (STOCK_PROJECTION_SOURCE)
+    stock_projection = asyncio.create_task(run_stock_projection())
+    yield
+    stock_projection.cancel()
+    checkout.cancel()
+    await close_service_clients()
+
+app = FastAPI(lifespan=lifespan)
 
 # Include routers
 app.include_router(order_router)
 app.include_router(router)
+app.include_router(debug_router)
+app.include_router(stock_events_router)
 
-@app.middleware("http")
-async def prometheus_middleware(request: Request, call_next):
-    start_time = time.time()
-    status_code = 500  # Default to internal error status
-    
-    try:
-        response = await call_next(request)
-        status_code = response.status_code
-        return response
-    except HTTPException as http_exc:
-        status_code = http_exc.status_code
-        raise
-    except Exception as exc:
-        logger.error(f"Unhandled exception: {str(exc)}", exc_info=True)
-        raise
-    finally:
-        # Always record metrics
-        process_time = time.time() - start_time
-        path = request.url.path
-        
-        # Standardize path (replace IDs with {id})
-        if "/orders/" in path and path.count("/") > 2:
-            path = "/orders/{id}"
-        
-        REQUEST_COUNT.labels(
-            method=request.method.lower(),
-            path=path,
-            status_code=str(status_code)
-        ).inc()
-        
-        REQUEST_LATENCY.labels(
-            method=request.method.lower(),
-            path=path
-        ).observe(process_time)
+# Add middleware
+app.add_middleware(PrometheusMiddleware)
+app.add_middleware(SQLStatsMiddleware)
+# Outermost, so its span and Server-Timing cover the other middleware too
+app.add_middleware(TracingMiddleware)
@@ -1,13 +1,41 @@
-from sqlalchemy import ForeignKey, Integer, String, Float
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import ForeignKey, Index, Integer, String, Float
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.database import Base
 
+# Order status: pending until inventory is reserved, then confirmed, or rejected (out of stock, unknown item, ...)
+PENDING = "pending"
+CONFIRMED = "confirmed"
+REJECTED = "rejected"
+
 class Order(Base):
     __tablename__ = "orders"
+    # Keyset pagination walks orders by id, per user or per status
+    __table_args__ = (
+        Index("ix_orders_user_id_id", "user_id", "id"),
+        Index("ix_orders_status_id", "status", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(Integer, nullable=False)
-    item_id: Mapped[int] = mapped_column(Integer, nullable=False)
-    quantity: Mapped[int] = mapped_column(Integer)
+    # item_id/quantity are only set for single-item orders, cart orders keep them in `lines`
+    item_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    quantity: Mapped[int | None] = mapped_column(Integer, nullable=True)
     total_price: Mapped[float] = mapped_column(Float)
-    status: Mapped[str] = mapped_column(String(50), default="pending")
+    status: Mapped[str] = mapped_column(String(50), default=PENDING)
+    # Also the key of the inventory reservation backing this order, makes order creation retry-safe
+    idempotency_key: Mapped[str | None] = mapped_column(String(100), unique=True, nullable=True)
+
+    lines: Mapped[list["OrderLine"]] = relationship(
+        back_populates="order", cascade="all, delete-orphan", lazy="selectin"
+    )
+
+class OrderLine(Base):
+    __tablename__ = "order_lines"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    order_id: Mapped[int] = mapped_column(ForeignKey("orders.id", ondelete="CASCADE"), index=True)
+    item_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    unit_price: Mapped[float] = mapped_column(Float, nullable=False)
+
+    order: Mapped[Order] = relationship(back_populates="lines")
@@ -0,0 +1,25 @@
+from datetime import datetime
+from sqlalchemy import ForeignKey, Index, Integer, String, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.database import Base
+
+# Outbox lifecycle: queued -> processing (claimed by a checkout worker) -> done, or back to queued for a retry
+QUEUED = "queued"
+PROCESSING = "processing"
+DONE = "done"
+
+class OrderOutbox(Base):
+    """Inventory work for an order accepted with 202, written in the same transaction as the order.
+    Confirmed orders get one too when committing their reservation failed: only the commit is left."""
+    __tablename__ = "order_outbox"
+    # Workers pick the oldest due rows
+    __table_args__ = (Index("ix_order_outbox_status_available_at", "status", "available_at"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    order_id: Mapped[int] = mapped_column(ForeignKey("orders.id", ondelete="CASCADE"), unique=True)
+    status: Mapped[str] = mapped_column(String(20), default=QUEUED)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    available_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    claimed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
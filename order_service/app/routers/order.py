@@ -1,41 +1,211 @@
-from fastapi import APIRouter, Depends, HTTPException
+import os
+import time
+from uuid import uuid4
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.database import get_db
-from app.schemas.order import OrderCreate, OrderOut, OrderUpdate
-from app.crud.order import create_order, get_all_orders, get_order_by_id, update_order, delete_order
+from app.schemas.order import OrderCreate, OrderOut, OrderUpdate, CartOrderCreate, OrderStatusOut
+from app.crud.order import (
+    create_order, create_cart_order, get_all_orders, stream_orders, get_order_by_id,
+    get_order_by_idempotency_key, update_order, delete_order
+)
+from app.crud.checkout import create_checkout_order, get_order_status
+from app.models.order import PENDING
 from app.utils.logger import logger
 from app.auth.jwt_handler import get_current_user
-from app.utils.service_clients import get_item_by_id, get_user_by_id, check_item_availability, reduce_inventory, increase_inventory
+from app.utils.service_clients import (
+    get_item_by_id, get_user_by_id, reserve_inventory, reserve_inventory_batch,
+    commit_reservation, release_reservation, increase_inventory
+)
+from app.utils.checkout_worker import notify_new_order, wait_for_status_change, requeue_reservation_commit
+from app.utils.stock_projection import projection
+from app.utils.fast_json import json_rows_response, dumps_row
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
+# Accept every order with 202 and reserve stock in the background; otherwise only when the client
+# sends "Prefer: respond-async"
+ORDER_ASYNC_CHECKOUT = os.getenv("ORDER_ASYNC_CHECKOUT", "false").lower() in ("1", "true", "yes")
+# Longest a GET /orders/{id}/status long-poll may wait, and how often it re-reads the order meanwhile
+ORDER_STATUS_MAX_WAIT = float(os.getenv("ORDER_STATUS_MAX_WAIT", 30))
+ORDER_STATUS_POLL_INTERVAL = float(os.getenv("ORDER_STATUS_POLL_INTERVAL", 1.0))
+
+def _wants_async(prefer: str | None) -> bool:
+    return ORDER_ASYNC_CHECKOUT or (prefer is not None and "respond-async" in prefer.lower())
+
+def _accepted(response: Response, order):
+    """202 + Location of the status long-poll while the order is still pending"""
+    if order.status == PENDING:
+        response.status_code = 202
+        response.headers["Location"] = f"/orders/{order.id}/status"
+    return order
+
+def _order_key(user_id: int, idempotency_key: str | None) -> str:
+    """Scope the client's Idempotency-Key to the user. Without one we still generate a key,
+    so our own retries towards inventory can't reserve twice."""
+    if idempotency_key and len(idempotency_key) > 64:
+        raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+    return f"order-{user_id}-{idempotency_key or uuid4().hex}"
+
+async def _complete_order(db: AsyncSession, key: str, store_order):
+    """Saga tail: store the order, then commit the reservation, or release it if storing failed"""
+    try:
+        new_order = await store_order()
+    except IntegrityError:
+        # A concurrent request with the same key stored its order first, that order owns the reservation
+        await db.rollback()
+        existing = await get_order_by_idempotency_key(db, key)
+        if existing:
+            return existing
+        await _release(key)
+        raise
+    except Exception:
+        await _release(key)
+        raise
+    try:
+        await commit_reservation(key)
+    except Exception as e:
+        # The order is stored, so never compensate here; a checkout worker retries the commit
+        logger.error("Could not commit reservation %s for order %s", key, new_order.id, exc_info=True)
+        await requeue_reservation_commit(new_order.id, str(getattr(e, "detail", None) or repr(e)))
+    return new_order
+
+async def _release(key: str):
+    try:
+        await release_reservation(key)
+    except Exception:
+        # The sweeper in inventory_service releases it once the reservation TTL expires
+        logger.error("Could not release reservation %s", key, exc_info=True)
+
 @router.post("/", response_model=OrderOut)
-async def create(order: OrderCreate, db: AsyncSession = Depends(get_db), user=Depends(get_current_user)):
+async def create(
+    order: OrderCreate,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+    idempotency_key: str | None = Header(None),
+    prefer: str | None = Header(None)
+):
     logger.info("Creating order")
     # Use the authenticated user's ID
     order.user_id = int(user["user_id"])
-    # Validate item
-    await get_item_by_id(order.item_id)
     if user["role"] == "admin":
         raise HTTPException(status_code=401, detail="Admin cannot create an order")
-    # Check item availability
-    available_qty = await check_item_availability(order.item_id)
-    if available_qty < 1:
+    key = _order_key(order.user_id, idempotency_key)
+    existing = await get_order_by_idempotency_key(db, key)
+    if existing:
+        return _accepted(response, existing)
+    # Fast path: the stock projection already knows there isn't enough, don't bother inventory
+    if projection.short_items({order.item_id: order.quantity}):
         raise HTTPException(status_code=400, detail="Item out of stock")
-    # Reduce inventory quantity
-    quantity = order.quantity
-    await reduce_inventory(order.item_id, quantity)
+    if _wants_async(prefer):
+        # Pending order + outbox row, a checkout worker reserves the stock and confirms or rejects it
+        new_order = await create_checkout_order(
+            db, order.user_id, key, item_id=order.item_id, quantity=order.quantity,
+            prices={order.item_id: projection.price(order.item_id)}
+        )
+        notify_new_order()
+        return _accepted(response, new_order)
+    # Validate item, check stock and reserve it in one call; inventory also returns the price
+    reservation = await reserve_inventory(order.item_id, order.quantity, key)
+    order.total_price = reservation["total_price"]
     # Create order
-    return await create_order(db, order)
+    return await _complete_order(db, key, lambda: create_order(db, order, key))
+
+# Multi-item checkout: the whole cart is reserved with a single inventory call
+@router.post("/cart", response_model=OrderOut)
+async def create_cart(
+    cart: CartOrderCreate,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+    idempotency_key: str | None = Header(None),
+    prefer: str | None = Header(None)
+):
+    logger.info("Creating cart order")
+    if user["role"] == "admin":
+        raise HTTPException(status_code=401, detail="Admin cannot create an order")
+    if not cart.lines:
+        raise HTTPException(status_code=400, detail="Cart is empty")
+    user_id = int(user["user_id"])
+    key = _order_key(user_id, idempotency_key)
+    existing = await get_order_by_idempotency_key(db, key)
+    if existing:
+        return _accepted(response, existing)
+    short = projection.short_items({line.item_id: line.quantity for line in cart.lines})
+    if short:
+        # Same detail inventory would answer with
+        raise HTTPException(status_code=400, detail={"message": "Out of Stock", "item_ids": short})
+    if _wants_async(prefer):
+        lines = [(line.item_id, line.quantity) for line in cart.lines]
+        prices = {item_id: projection.price(item_id) for item_id, _ in lines}
+        new_order = await create_checkout_order(db, user_id, key, lines=lines, prices=prices)
+        notify_new_order()
+        return _accepted(response, new_order)
+    reservation = await reserve_inventory_batch(
+        [{"item_id": line.item_id, "qty": line.quantity} for line in cart.lines],
+        key
+    )
+    return await _complete_order(db, key, lambda: create_cart_order(db, user_id, reservation, key))
+
+async def _ndjson_orders(orders):
+    async for order in orders:
+        yield dumps_row(order, OrderOut) + b"\n"
 
 @router.get("/", response_model=list[OrderOut])
-async def get_all(db: AsyncSession = Depends(get_db), user=Depends(get_current_user)):
+async def get_all(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    after: int | None = Query(None, description="Cursor: id of the last order of the previous page"),
+    status: str | None = None,
+    item_id: int | None = None,
+    user_id: int | None = Query(None, description="Admins only: orders of this user"),
+    stream: bool = Query(False, description="Stream every matching order as NDJSON, ignores limit"),
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user)
+):
     logger.info("Fetching all orders")
-    return await get_all_orders(db, user["user_id"], user["role"])
+    filters = {"status": status, "item_id": item_id, "owner_id": user_id, "after": after}
+    if stream:
+        orders = stream_orders(user["user_id"], user["role"], **filters)
+        return StreamingResponse(_ndjson_orders(orders), media_type="application/x-ndjson")
+
+    # Keyset pagination: one extra row tells us whether there is a next page
+    orders = await get_all_orders(db, user["user_id"], user["role"], limit=limit + 1, **filters)
+    if len(orders) > limit:
+        orders = orders[:limit]
+        response.headers["X-Next-Cursor"] = str(orders[-1].id)
+    fast_response = json_rows_response(orders, OrderOut, response.headers)
+    if fast_response is not None:
+        return fast_response
+    return orders
+
+# Long-poll: answers as soon as the order leaves "pending", or with the pending status after `wait` seconds
+@router.get("/{order_id}/status", response_model=OrderStatusOut)
+async def get_status(
+    order_id: int,
+    wait: float = Query(0, ge=0, description="Seconds to wait for a pending order to be decided"),
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user)
+):
+    deadline = time.monotonic() + min(wait, ORDER_STATUS_MAX_WAIT)
+    while True:
+        row = await get_order_status(db, order_id, user["user_id"], user["role"])
+        # End the read transaction, a waiting long-poll must not hold a pooled connection
+        await db.commit()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Order not found")
+        remaining = deadline - time.monotonic()
+        if row.status != PENDING or remaining <= 0:
+            return OrderStatusOut(id=order_id, status=row.status, total_price=row.total_price)
+        # Woken right away when this process decides the order; the re-read covers other processes
+        await wait_for_status_change(order_id, min(remaining, ORDER_STATUS_POLL_INTERVAL))
 
 @router.get("/{order_id}", response_model=OrderOut)
 async def get(order_id: int, db: AsyncSession = Depends(get_db), user=Depends(get_current_user)):
-    logger.info(f"Fetching order {order_id}")
+    logger.info("Fetching order %s", order_id)
     order = await get_order_by_id(db, order_id, user["user_id"], user["role"])
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -43,7 +213,7 @@ async def get(order_id: int, db: AsyncSession = Depends(get_db), user=Depends(ge
 
 @router.put("/{order_id}", response_model=OrderOut)
 async def update(order_id: int, order: OrderUpdate, db: AsyncSession = Depends(get_db), user=Depends(get_current_user)):
-    logger.info(f"Updating order {order_id}")
+    logger.info("Updating order %s", order_id)
     # Only validate if user_id or item_id is being updated
     if order.user_id is not None:
         await get_user_by_id(order.user_id)
@@ -61,7 +231,7 @@ async def delete(order_id: int, db: AsyncSession = Depends(get_db), user=Depends
         raise HTTPException(status_code=404, detail="Order not found or not authorized")
 
     # Delete order
-    logger.info(f"Deleting order {order_id}")
+    logger.info("Deleting order %s", order_id)
     quantity = order.quantity
     await delete_order(db, order_id)
     # Step 2: Restore inventory quantity
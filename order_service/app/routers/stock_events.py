@@ -0,0 +1,16 @@
+import secrets
+from fastapi import APIRouter, Header, HTTPException
+from app.schemas.stock_event import StockEventBatch
+from app.utils.stock_projection import projection, STOCK_PROJECTION_SOURCE, STOCK_EVENTS_TOKEN
+
+router = APIRouter(prefix="/internal", tags=["Internal"])
+
+# Webhook for inventory_service's "http" stock-event transport (STOCK_PROJECTION_SOURCE=http)
+@router.post("/stock-events")
+async def receive_stock_events(batch: StockEventBatch, x_stock_events_token: str | None = Header(None)):
+    if STOCK_PROJECTION_SOURCE != "http":
+        raise HTTPException(status_code=404, detail="Not Found")
+    # check_stock_projection_config refuses to start without a token, never accept events unauthenticated
+    if not STOCK_EVENTS_TOKEN or not secrets.compare_digest(x_stock_events_token or "", STOCK_EVENTS_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid stock events token")
+    return {"applied": projection.apply([event.model_dump() for event in batch.events])}
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class OrderBase(BaseModel):
     user_id: int
@@ -8,14 +8,39 @@ class OrderBase(BaseModel):
     status: str = "pending"
 
 class OrderCreate(OrderBase):
-    pass
+    quantity: int = Field(gt=0)
 
 class OrderUpdate(OrderBase):
     quantity: int | None = None
     status: str | None = None
 
+class CartLine(BaseModel):
+    item_id: int
+    quantity: int = Field(gt=0)
+
+class CartOrderCreate(BaseModel):
+    lines: list[CartLine]
+
+class OrderLineOut(BaseModel):
+    item_id: int
+    quantity: int
+    unit_price: float
+
+    class Config:
+        orm_mode = True
+
 class OrderOut(OrderBase):
     id: int 
+    # Cart orders have no single item, their items are in `lines`
+    item_id: int | None = None
+    quantity: int | None = None
+    lines: list[OrderLineOut] = []
 
     class Config:
         orm_mode = True
+
+
+class OrderStatusOut(BaseModel):
+    id: int
+    status: str
+    total_price: float
@@ -0,0 +1,20 @@
+from pydantic import BaseModel, model_validator
+
+class StockEvent(BaseModel):
+    item_id: int
+    # Deletions carry no version, every other event needs all three
+    version: int | None = None
+    quantity: int | None = None
+    price: float | None = None
+    deleted: bool = False
+    # When inventory published it (epoch seconds), for the event lag histogram
+    ts: float | None = None
+
+    @model_validator(mode="after")
+    def _check_stock(self):
+        if not self.deleted and None in (self.version, self.quantity, self.price):
+            raise ValueError("version, quantity and price are required unless deleted")
+        return self
+
+class StockEventBatch(BaseModel):
+    events: list[StockEvent]
@@ -0,0 +1,214 @@
+import asyncio
+import os
+import time
+from collections import defaultdict
+from datetime import timezone
+from fastapi import HTTPException
+from app.db.database import AsyncSessionLocal
+from app.crud.checkout import (
+    claim_checkout_batch, confirm_checkout_order, reject_checkout_order, retry_checkout_order,
+    queue_reservation_commit, finish_reservation_commit
+)
+from app.models.order import CONFIRMED
+from app.utils.logger import logger
+from app.utils.metrics import CHECKOUT_PROCESSED, CHECKOUT_DELAY
+from app.utils.service_clients import (
+    OUT_OF_STOCK, reserve_inventory, reserve_inventory_batch, commit_reservation, release_reservation
+)
+
+CHECKOUT_WORKERS = int(os.getenv("CHECKOUT_WORKERS", 4))
+CHECKOUT_BATCH_SIZE = int(os.getenv("CHECKOUT_BATCH_SIZE", 50))
+CHECKOUT_POLL_INTERVAL = float(os.getenv("CHECKOUT_POLL_INTERVAL", 1.0))
+CHECKOUT_MAX_ATTEMPTS = int(os.getenv("CHECKOUT_MAX_ATTEMPTS", 5))
+# A claimed row whose worker died is picked up again after this many seconds
+CHECKOUT_CLAIM_TIMEOUT = float(os.getenv("CHECKOUT_CLAIM_TIMEOUT", 60))
+
+# Set when an order is accepted, so an idle dispatcher doesn't wait for the next poll
+_new_orders = asyncio.Event()
+# Long-polls waiting for an order's status to change: order id -> [event, number of waiters]
+_status_events: dict[int, list] = {}
+
+def notify_new_order():
+    _new_orders.set()
+
+async def wait_for_status_change(order_id: int, timeout: float):
+    """Sleep until this process decides the order or `timeout` passes, whichever is first"""
+    waiting = _status_events.get(order_id)
+    if waiting is None:
+        waiting = _status_events[order_id] = [asyncio.Event(), 0]
+    waiting[1] += 1
+    try:
+        await asyncio.wait_for(waiting[0].wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        waiting[1] -= 1
+        # The last waiter cleans up, also when another process decides the order and nobody sets the event
+        if waiting[1] == 0 and _status_events.get(order_id) is waiting:
+            del _status_events[order_id]
+
+def _publish_status(order_id: int):
+    waiting = _status_events.pop(order_id, None)
+    if waiting is not None:
+        waiting[0].set()
+
+async def run_checkout_workers(workers: int = CHECKOUT_WORKERS):
+    """Background task: claim outbox rows in batches and hand them to `workers` consumers.
+    Orders for the same item go to one consumer, in order."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+    consumers = [asyncio.create_task(_consume(queue)) for _ in range(workers)]
+    try:
+        while True:
+            try:
+                claimed = await _dispatch(queue)
+            except Exception:
+                # Keep going, a transient DB error must not kill the pipeline
+                logger.exception("Checkout dispatch failed")
+                claimed = 0
+            if claimed < CHECKOUT_BATCH_SIZE:
+                # Outbox drained: wait for a new order or the next poll (other processes add rows too)
+                try:
+                    await asyncio.wait_for(_new_orders.wait(), CHECKOUT_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                _new_orders.clear()
+    finally:
+        for consumer in consumers:
+            consumer.cancel()
+
+async def _dispatch(queue: asyncio.Queue) -> int:
+    async with AsyncSessionLocal() as db:
+        claimed = await claim_checkout_batch(db, CHECKOUT_BATCH_SIZE, CHECKOUT_CLAIM_TIMEOUT)
+    groups = defaultdict(list)
+    for entry, order in claimed:
+        # Single-item orders are grouped per item, cart orders go alone
+        groups[("item", order.item_id) if order.item_id is not None else ("order", order.id)].append((entry, order))
+    for group in groups.values():
+        # Blocks while every consumer is busy, which also throttles claiming
+        await queue.put(group)
+    return len(claimed)
+
+async def _consume(queue: asyncio.Queue):
+    while True:
+        group = await queue.get()
+        try:
+            await _process_group(group)
+        except Exception:
+            logger.exception("Checkout worker failed")
+        finally:
+            queue.task_done()
+
+async def _process_group(group):
+    """Reserve the orders of one item oldest first. Once a quantity was refused for lack of stock,
+    orders for at least as much are rejected without another inventory call."""
+    refused_qty = None
+    for entry, order in group:
+        if order.status == CONFIRMED:
+            await _commit(entry, order)
+            continue
+        if refused_qty is not None and order.quantity >= refused_qty:
+            await _reject(entry, order, OUT_OF_STOCK)
+            continue
+        if await _process(entry, order) == "out_of_stock":
+            refused_qty = order.quantity if refused_qty is None else min(refused_qty, order.quantity)
+
+async def _process(entry, order) -> str:
+    key = order.idempotency_key
+    try:
+        if order.lines:
+            reservation = await reserve_inventory_batch(
+                [{"item_id": line.item_id, "qty": line.quantity} for line in order.lines], key
+            )
+        else:
+            reservation = await reserve_inventory(order.item_id, order.quantity, key)
+    except HTTPException as e:
+        if e.status_code < 500:
+            # Unknown item, out of stock, ...: retrying won't change the answer
+            await _reject(entry, order, _reason(e.detail))
+            return "out_of_stock" if e.detail == OUT_OF_STOCK else "rejected"
+        return await _retry(entry, order, str(e.detail))
+
+    try:
+        async with AsyncSessionLocal() as db:
+            await confirm_checkout_order(db, order.id, reservation)
+    except Exception:
+        # Keep the reservation: the retry replays it under the same key and confirms the order then
+        logger.exception("Could not confirm order %s", order.id)
+        return await _retry(entry, order, "Could not store confirmation")
+
+    _observe(entry, "confirmed")
+    _publish_status(order.id)
+    try:
+        await commit_reservation(key)
+    except Exception as e:
+        logger.error("Could not commit reservation %s for order %s", key, order.id, exc_info=True)
+        await requeue_reservation_commit(order.id, _reason(getattr(e, "detail", None) or repr(e)))
+    return "confirmed"
+
+async def requeue_reservation_commit(order_id: int, reason: str):
+    """The order is stored, so never compensate: retry the commit from the outbox, before inventory's
+    TTL sweeper releases the reservation and the stock goes back on sale"""
+    try:
+        async with AsyncSessionLocal() as db:
+            await queue_reservation_commit(db, order_id, reason)
+    except Exception:
+        logger.exception("Could not queue the reservation commit of order %s", order_id)
+        return
+    notify_new_order()
+
+async def _commit(entry, order) -> str:
+    """Confirmed order whose reservation commit failed earlier: only the commit is left"""
+    key = order.idempotency_key
+    try:
+        await commit_reservation(key)
+    except Exception as e:
+        if isinstance(e, HTTPException) and e.status_code in (404, 409):
+            # Too late, the stock may have been sold again: an operator has to settle this order
+            logger.error("Reservation %s of confirmed order %s can't be committed: %s", key, order.id, e.detail)
+            async with AsyncSessionLocal() as db:
+                await finish_reservation_commit(db, order.id, f"Reservation not committed: {_reason(e.detail)}")
+            CHECKOUT_PROCESSED.labels(result="commit_failed").inc()
+            return "commit_failed"
+        async with AsyncSessionLocal() as db:
+            await retry_checkout_order(db, order.id, _reason(getattr(e, "detail", None) or repr(e)),
+                                       delay=min(60, 2 ** entry.attempts))
+        CHECKOUT_PROCESSED.labels(result="retried").inc()
+        return "retried"
+    async with AsyncSessionLocal() as db:
+        await finish_reservation_commit(db, order.id)
+    CHECKOUT_PROCESSED.labels(result="committed").inc()
+    return "committed"
+
+def _reason(detail) -> str:
+    """Rejection reason stored on the order; cart answers are {"message", "item_ids"}"""
+    if isinstance(detail, dict) and "message" in detail:
+        item_ids = detail.get("item_ids")
+        return f"{detail['message']} (items {', '.join(map(str, item_ids))})" if item_ids else detail["message"]
+    return detail if isinstance(detail, str) else str(detail)
+
+async def _reject(entry, order, reason: str):
+    async with AsyncSessionLocal() as db:
+        await reject_checkout_order(db, order.id, reason)
+    _observe(entry, "rejected")
+    _publish_status(order.id)
+
+async def _retry(entry, order, reason: str) -> str:
+    if entry.attempts >= CHECKOUT_MAX_ATTEMPTS:
+        logger.error("Giving up on order %s after %s attempts: %s", order.id, entry.attempts, reason)
+        # A reservation may exist even though we never saw the answer
+        try:
+            await release_reservation(order.idempotency_key)
+        except Exception:
+            logger.error("Could not release reservation %s", order.idempotency_key, exc_info=True)
+        await _reject(entry, order, reason)
+        return "rejected"
+    async with AsyncSessionLocal() as db:
+        await retry_checkout_order(db, order.id, reason, delay=min(60, 2 ** entry.attempts))
+    CHECKOUT_PROCESSED.labels(result="retried").inc()
+    return "retried"
+
+def _observe(entry, result: str):
+    CHECKOUT_PROCESSED.labels(result=result).inc()
+    # SQLite hands back naive UTC datetimes
+    created_at = entry.created_at if entry.created_at.tzinfo else entry.created_at.replace(tzinfo=timezone.utc)
+    CHECKOUT_DELAY.observe(max(0.0, time.time() - created_at.timestamp()))
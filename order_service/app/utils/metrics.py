@@ -1,6 +1,7 @@
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from fastapi import Response, APIRouter
 import re
+import time
 
 router = APIRouter()
 
@@ -17,12 +18,215 @@ REQUEST_LATENCY = Histogram(
     buckets=[0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0]  
 )
 
+# Outbound calls to other services (pooled httpx clients in service_clients.py)
+HTTP_CLIENT_IN_FLIGHT = Gauge(
+    "http_client_requests_in_flight",
+    "Outbound requests currently holding a pooled connection",
+    ["service"]
+)
+
+HTTP_CLIENT_POOL_LIMIT = Gauge(
+    "http_client_pool_max_connections",
+    "Configured connection limit of the outbound pool",
+    ["service"]
+)
+
+HTTP_CLIENT_POOL_TIMEOUTS = Counter(
+    "http_client_pool_timeouts_total",
+    "Outbound requests that gave up waiting for a free pooled connection",
+    ["service"]
+)
+
+HTTP_CLIENT_LATENCY = Histogram(
+    "http_client_request_duration_seconds",
+    "Latency of outbound requests to other services",
+    ["service", "method"],
+    buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+)
+
+HTTP_CLIENT_RETRIES = Counter(
+    "http_client_retries_total",
+    "Outbound requests retried after a failure",
+    ["service"]
+)
+
+HTTP_CLIENT_COLLAPSED = Counter(
+    "http_client_collapsed_requests_total",
+    "Lookups served without their own downstream call, by reason (inflight: joined a pending call, cached: micro-TTL cache)",
+    ["call", "reason"]
+)
+
+# Circuit breakers and retry budgets in app/utils/resilience.py
+CIRCUIT_STATE = Gauge(
+    "circuit_breaker_state",
+    "Breaker state per downstream service: 0 closed, 1 half-open, 2 open",
+    ["service"]
+)
+
+CIRCUIT_TRIPS = Counter(
+    "circuit_breaker_trips_total",
+    "Times the breaker opened",
+    ["service"]
+)
+
+CIRCUIT_REJECTED = Counter(
+    "circuit_breaker_rejected_total",
+    "Calls failed fast because the breaker was open",
+    ["service"]
+)
+
+RETRY_BUDGET_EXHAUSTED = Counter(
+    "retry_budget_exhausted_total",
+    "Retries skipped because the service's retry budget was spent",
+    ["service"]
+)
+
+# Asynchronous checkout (app/utils/checkout_worker.py)
+CHECKOUT_PROCESSED = Counter(
+    "checkout_orders_processed_total",
+    "Outbox orders handled by the checkout workers, by result (confirmed, rejected, retried; committed or commit_failed for retried reservation commits)",
+    ["result"]
+)
+
+CHECKOUT_DELAY = Histogram(
+    "checkout_decision_delay_seconds",
+    "Time from accepting an order (202) to confirming or rejecting it",
+    buckets=[0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0]
+)
+
+# Stock projection fed by inventory's stock-change events (app/utils/stock_projection.py)
+STOCK_PROJECTION_EVENT_LAG = Histogram(
+    "stock_projection_event_lag_seconds",
+    "Time from inventory publishing a stock event to the projection applying it",
+    buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+)
+
+STOCK_PROJECTION_STALENESS = Gauge(
+    "stock_projection_staleness_seconds",
+    "Seconds since the projection last applied a stock event"
+)
+
+STOCK_PROJECTION_ITEMS = Gauge(
+    "stock_projection_items",
+    "Items currently known to the stock projection"
+)
+
+STOCK_PROJECTION_REJECTIONS = Counter(
+    "stock_projection_rejections_total",
+    "Orders rejected as out of stock from the projection, without calling inventory"
+)
+
+# Decoded-JWT cache in app/auth/token_cache.py
+TOKEN_CACHE_HITS = Counter(
+    "auth_token_cache_hits_total",
+    "Bearer tokens served from the decoded-claims cache"
+)
+
+TOKEN_CACHE_MISSES = Counter(
+    "auth_token_cache_misses_total",
+    "Bearer tokens that had to be verified and decoded"
+)
+
+# Database connection pool (app/db/engine.py)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_seconds",
+    "Time spent waiting for a pooled database connection",
+    buckets=[0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0]
+)
+
+DB_POOL_WAITING = Gauge(
+    "db_pool_checkouts_waiting",
+    "Requests currently waiting for a database connection"
+)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "Database connections currently in use"
+)
+
+DB_POOL_CAPACITY = Gauge(
+    "db_pool_max_connections",
+    "Configured pool_size + max_overflow"
+)
+
+# SQL statements (app/db/instrumentation.py), labelled by statement template id, see /debug/sql-stats
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "Latency of SQL statements by template",
+    ["statement"],
+    buckets=[0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0]
+)
+
+DB_QUERY_ROWS = Histogram(
+    "db_query_rows",
+    "Rows returned or affected by SQL statements by template",
+    ["statement"],
+    buckets=[0, 1, 5, 10, 50, 100, 500, 1000, 5000]
+)
+
+DB_STATEMENTS_PER_REQUEST = Histogram(
+    "db_statements_per_request",
+    "SQL statements run while serving one HTTP request",
+    ["path"],
+    buckets=[0, 1, 2, 3, 5, 10, 20, 50, 100]
+)
+
 def sanitize_path(path: str) -> str:
     """EXACT same implementation as used in middleware"""
     path = re.sub(r"/\d+", "/{id}", path)  # Replace IDs with {id}
     path = re.sub(r"/+", "/", path)        # Normalize slashes
     return path.rstrip("/") or "/"          # Handle root path
 
+class PrometheusMiddleware:
+    """Raw ASGI middleware recording REQUEST_COUNT/REQUEST_LATENCY.
+
+    Requests are labelled with the template of the route the router matched ("/items/{item_id}"),
+    so nothing is rewritten per request and unknown paths all share the "unmatched" label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        # (method, path, status) -> bound label children, skips the .labels() lookup on hot paths
+        self._counters = {}
+        self._histograms = {}
+
+    def _counter(self, method: str, path: str, status_code: int):
+        key = (method, path, status_code)
+        child = self._counters.get(key)
+        if child is None:
+            child = self._counters[key] = REQUEST_COUNT.labels(method=method, path=path, status_code=str(status_code))
+        return child
+
+    def _histogram(self, method: str, path: str):
+        key = (method, path)
+        child = self._histograms.get(key)
+        if child is None:
+            child = self._histograms[key] = REQUEST_LATENCY.labels(method=method, path=path)
+        return child
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500  # Stays 500 if the app fails before starting a response
+        start_time = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"].lower()
+            self._histogram(method, path).observe(time.perf_counter() - start_time)
+            self._counter(method, path, status_code).inc()
+
 @router.get("/metrics")
 async def metrics():
     """Keep this endpoint simple as in your original"""
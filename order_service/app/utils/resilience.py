@@ -0,0 +1,116 @@
+import os
+import time
+from collections import deque
+from app.utils.metrics import CIRCUIT_STATE, CIRCUIT_TRIPS, CIRCUIT_REJECTED, RETRY_BUDGET_EXHAUSTED
+
+# Breaker: open after this many consecutive failures, probe again after the cool-down
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", 10.0))
+CIRCUIT_HALF_OPEN_REQUESTS = int(os.getenv("CIRCUIT_HALF_OPEN_REQUESTS", 1))
+
+# Retry budget: retries may add at most this share of the request volume, plus a small floor per second
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", 0.1))
+RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", 2.0))
+
+# Adaptive timeout: p99 of recent latencies times a margin, within [min, configured timeout]
+ADAPTIVE_TIMEOUT_MULTIPLIER = float(os.getenv("ADAPTIVE_TIMEOUT_MULTIPLIER", 3.0))
+ADAPTIVE_TIMEOUT_MIN = float(os.getenv("ADAPTIVE_TIMEOUT_MIN", 0.25))
+ADAPTIVE_TIMEOUT_WINDOW = int(os.getenv("ADAPTIVE_TIMEOUT_WINDOW", 500))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures; open rejects until the cool-down ends,
+    then half-open lets a few probes through: one success closes it, one failure re-opens it."""
+
+    def __init__(
+        self,
+        service: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = CIRCUIT_RESET_TIMEOUT,
+        half_open_requests: int = CIRCUIT_HALF_OPEN_REQUESTS
+    ):
+        self.service = service
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_requests = half_open_requests
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self._set_state(CLOSED)
+
+    def _set_state(self, state: str):
+        self.state = state
+        CIRCUIT_STATE.labels(service=self.service).set(_STATE_VALUES[state])
+
+    def allow(self) -> bool:
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                CIRCUIT_REJECTED.labels(service=self.service).inc()
+                return False
+            self._set_state(HALF_OPEN)
+            self.probes = 0
+        if self.state == HALF_OPEN:
+            if self.probes >= self.half_open_requests:
+                CIRCUIT_REJECTED.labels(service=self.service).inc()
+                return False
+            self.probes += 1
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        if self.state != CLOSED:
+            self._set_state(CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                CIRCUIT_TRIPS.labels(service=self.service).inc()
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+class RetryBudget:
+    """Token bucket shared by all requests to one service: every request deposits `ratio`
+    tokens, every retry spends one. Stops retry storms when the downstream is failing."""
+
+    def __init__(self, service: str, ratio: float = RETRY_BUDGET_RATIO, min_per_second: float = RETRY_BUDGET_MIN_PER_SECOND):
+        self.service = service
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = max(10.0, min_per_second * 10)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def deposit(self):
+        self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.min_per_second)
+        self.updated_at = now
+        if self.tokens < 1:
+            RETRY_BUDGET_EXHAUSTED.labels(service=self.service).inc()
+            return False
+        self.tokens -= 1
+        return True
+
+class AdaptiveTimeout:
+    """Request timeout following the observed p99 latency, capped by the configured timeout"""
+
+    def __init__(self, ceiling: float, window: int = ADAPTIVE_TIMEOUT_WINDOW):
+        self.ceiling = ceiling
+        self.samples: deque[float] = deque(maxlen=window)
+        self.current = ceiling
+        self._since_update = 0
+
+    def observe(self, latency: float):
+        self.samples.append(latency)
+        self._since_update += 1
+        # Re-sorting the window on every call would cost more than it saves
+        if self._since_update >= 50 and len(self.samples) >= 50:
+            self._since_update = 0
+            ordered = sorted(self.samples)
+            p99 = ordered[int(len(ordered) * 0.99) - 1]
+            self.current = min(self.ceiling, max(ADAPTIVE_TIMEOUT_MIN, p99 * ADAPTIVE_TIMEOUT_MULTIPLIER))
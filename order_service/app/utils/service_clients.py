@@ -1,8 +1,17 @@
+import asyncio
 import httpx
 import os
+import random
+import time
+from collections import OrderedDict
 from fastapi import HTTPException, status
 import logging
-from tenacity import retry, stop_after_attempt, wait_exponential
+from app.utils.metrics import (
+    HTTP_CLIENT_IN_FLIGHT, HTTP_CLIENT_POOL_LIMIT,
+    HTTP_CLIENT_POOL_TIMEOUTS, HTTP_CLIENT_LATENCY, HTTP_CLIENT_RETRIES, HTTP_CLIENT_COLLAPSED
+)
+from app.utils.resilience import CircuitBreaker, RetryBudget, AdaptiveTimeout
+from app.utils.tracing import start_span, add_timing
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -11,44 +20,226 @@ logger = logging.getLogger(__name__)
 USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://localhost:8000")
 INVENTORY_SERVICE_URL = os.getenv("INVENTORY_SERVICE_URL", "http://localhost:8001")
 
-# Configure retry policy
-RETRY_POLICY = {
-    "stop": stop_after_attempt(3),
-    "wait": wait_exponential(multiplier=1, min=2, max=10),
-    "reraise": True
+# Connection pool settings shared by every downstream client
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30.0))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", 2.0))
+# HTTP/2 needs the optional "h2" package (pip install httpx[http2])
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Per-service settings: name -> (base url, request timeout in seconds)
+SERVICES = {
+    "user": (USER_SERVICE_URL, float(os.getenv("USER_SERVICE_TIMEOUT", 5.0))),
+    "inventory": (INVENTORY_SERVICE_URL, float(os.getenv("INVENTORY_SERVICE_TIMEOUT", 5.0))),
 }
 
-async def make_service_request(
-    method: str,
-    service_url: str,
-    endpoint: str,
-    **kwargs
-):
-    """Generic service request handler with retries and logging"""
-    url = f"{service_url}{endpoint}"
-    logger.info(f"Making {method} request to {url}")
-    
-    async with httpx.AsyncClient(timeout=10.0) as client:
+# One long-lived client (and connection pool) per downstream service, keyed by base url
+_clients: dict[str, httpx.AsyncClient] = {}
+_service_names = {url: name for name, (url, _) in SERVICES.items()}
+
+# Last seen (etag, body) per item, revalidated with If-None-Match so unchanged items come back as empty 304s
+ITEM_ETAG_CACHE_SIZE = int(os.getenv("ITEM_ETAG_CACHE_SIZE", 1000))
+_item_etags: OrderedDict[int, tuple[str, dict]] = OrderedDict()
+
+# Single-flight lookups: concurrent identical GETs share one request, whose result is reused for this long
+LOOKUP_CACHE_TTL = float(os.getenv("LOOKUP_CACHE_TTL", 0.5))
+LOOKUP_CACHE_SIZE = int(os.getenv("LOOKUP_CACHE_SIZE", 10000))
+_inflight: dict[tuple, asyncio.Task] = {}
+_lookup_cache: OrderedDict[tuple, tuple[float, dict]] = OrderedDict()
+
+# Retries: only for idempotent calls, with short jittered backoff, within each service's retry budget
+HTTP_RETRY_ATTEMPTS = int(os.getenv("HTTP_RETRY_ATTEMPTS", 3))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", 0.05))
+HTTP_RETRY_BACKOFF_MAX = float(os.getenv("HTTP_RETRY_BACKOFF_MAX", 0.5))
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Detail of a reservation refused for lack of stock, other 400s (bad quantity, ...) keep inventory's detail
+OUT_OF_STOCK = "Item out of stock"
+
+# Per-service resilience state, shared by every request
+_breakers = {name: CircuitBreaker(name) for name in SERVICES}
+_budgets = {name: RetryBudget(name) for name in SERVICES}
+_timeouts = {name: AdaptiveTimeout(timeout) for name, (_, timeout) in SERVICES.items()}
+
+def _build_client(service_url: str, timeout: float, transport: httpx.AsyncBaseTransport | None = None) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(
+        base_url=service_url,
+        timeout=httpx.Timeout(timeout, pool=HTTP_POOL_TIMEOUT),
+        limits=limits,
+        http2=HTTP2_ENABLED,
+        transport=transport,
+    )
+
+async def start_service_clients(transports: dict[str, httpx.AsyncBaseTransport] | None = None):
+    """Create the pooled clients, called once from the app lifespan.
+    `transports` maps a service name to a custom transport (e.g. an in-process ASGI app)."""
+    transports = transports or {}
+    for name, (url, timeout) in SERVICES.items():
+        if url in _clients:
+            continue
+        _clients[url] = _build_client(url, timeout, transports.get(name))
+        HTTP_CLIENT_POOL_LIMIT.labels(service=name).set(HTTP_MAX_CONNECTIONS)
+
+async def close_service_clients():
+    """Close every pooled client, called from the app lifespan on shutdown"""
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
+
+def get_service_client(service_url: str) -> httpx.AsyncClient:
+    client = _clients.get(service_url)
+    if client is None:
+        # Not started through the lifespan (scripts, shells): create it lazily
+        timeout = next((t for url, t in SERVICES.values() if url == service_url), 10.0)
+        client = _clients[service_url] = _build_client(service_url, timeout)
+    return client
+
+async def _send(client: httpx.AsyncClient, service: str, method: str, endpoint: str, **kwargs) -> httpx.Response:
+    """One attempt, transport errors mapped to 502/503/504. Each attempt is a client span whose
+    traceparent goes along, so the downstream service continues the trace."""
+    timeout = _timeouts.get(service)
+    if timeout is not None:
+        kwargs.setdefault("timeout", httpx.Timeout(timeout.current, pool=HTTP_POOL_TIMEOUT))
+    in_flight = HTTP_CLIENT_IN_FLIGHT.labels(service=service)
+    with start_span(f"{method} {service}", "client", **{"http.url": f"{client.base_url}{endpoint}"}) as span:
+        kwargs["headers"] = {**(kwargs.get("headers") or {}), "traceparent": span.traceparent()}
+        in_flight.inc()
+        start_time = time.perf_counter()
         try:
-            response = await client.request(method, url, **kwargs)
-            logger.debug(f"Response from {url}: {response.status_code}")
+            response = await client.request(method, endpoint, **kwargs)
+            span.attributes["http.status_code"] = response.status_code
             return response
+        except httpx.PoolTimeout:
+            HTTP_CLIENT_POOL_TIMEOUTS.labels(service=service).inc()
+            logger.error("Connection pool exhausted calling %s%s", client.base_url, endpoint)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Too many concurrent requests to {client.base_url}"
+            )
         except httpx.ConnectError as e:
-            logger.error(f"Connection error to {url}: {str(e)}")
+            logger.error("Connection error to %s%s: %s", client.base_url, endpoint, e)
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Service at {service_url} is unreachable"
+                detail=f"Service at {client.base_url} is unreachable"
             )
-        except httpx.TimeoutException as e:
-            logger.error(f"Timeout calling {url}")
+        except httpx.TimeoutException:
+            logger.error("Timeout calling %s%s", client.base_url, endpoint)
             raise HTTPException(
                 status_code=status.HTTP_504_GATEWAY_TIMEOUT,
                 detail="Service request timed out"
             )
+        except httpx.HTTPError as e:
+            # Connection dropped mid-request, malformed response, ...
+            logger.error("Transport error calling %s%s: %r", client.base_url, endpoint, e)
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Bad response from {client.base_url}"
+            )
+        finally:
+            elapsed = time.perf_counter() - start_time
+            in_flight.dec()
+            HTTP_CLIENT_LATENCY.labels(service=service, method=method.lower()).observe(elapsed)
+            # Server-Timing of the request we are serving gets one entry per downstream service
+            add_timing(service, elapsed)
+            if timeout is not None:
+                timeout.observe(elapsed)
+
+async def make_service_request(
+    method: str,
+    service_url: str,
+    endpoint: str,
+    idempotent: bool | None = None,
+    **kwargs
+):
+    """Generic service request handler with circuit breaking, retries and logging.
+    Only idempotent calls are retried: GET/HEAD/OPTIONS, requests carrying an Idempotency-Key,
+    or callers passing idempotent=True."""
+    logger.info("Making %s request to %s%s", method, service_url, endpoint, extra={"sampled": True})
+
+    client = get_service_client(service_url)
+    service = _service_names.get(service_url, service_url)
+    breaker = _breakers.get(service)
+    budget = _budgets.get(service)
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS or "Idempotency-Key" in (kwargs.get("headers") or {})
+    if budget is not None:
+        budget.deposit()
+
+    attempt = 1
+    while True:
+        if breaker is not None and not breaker.allow():
+            # Fail fast instead of queueing more work on a service that is already failing
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"{service} service unavailable (circuit open)"
+            )
+        failed = True
+        try:
+            response = await _send(client, service, method, endpoint, **kwargs)
+            error = None
+            # 4xx answers (not found, out of stock, ...) are the service working, 5xx are failures
+            failed = response.status_code >= 500
+        except HTTPException as e:
+            response, error = None, e
+        finally:
+            # Also on cancellation or an unexpected error: a half-open probe must always resolve,
+            # or its slot stays taken and the breaker never closes again
+            if breaker is not None:
+                if failed:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+        if not failed:
+            logger.debug("Response from %s%s: %s", service_url, endpoint, response.status_code)
+            return response
+
+        if not idempotent or attempt >= HTTP_RETRY_ATTEMPTS or (budget is not None and not budget.try_spend()):
+            if error is not None:
+                raise error
+            return response
+        HTTP_CLIENT_RETRIES.labels(service=service).inc()
+        # Full jitter, so retries from concurrent requests don't arrive together
+        await asyncio.sleep(random.uniform(0, min(HTTP_RETRY_BACKOFF_MAX, HTTP_RETRY_BACKOFF * 2 ** attempt)))
+        attempt += 1
+
+async def _single_flight(key: tuple, fetch) -> dict:
+    """Collapse concurrent identical lookups into one downstream call and keep its result for
+    LOOKUP_CACHE_TTL seconds. Callers get their own copy of the result."""
+    cached = _lookup_cache.get(key)
+    if cached is not None:
+        if cached[0] > time.monotonic():
+            HTTP_CLIENT_COLLAPSED.labels(call=key[0], reason="cached").inc()
+            return dict(cached[1])
+        del _lookup_cache[key]
+
+    task = _inflight.get(key)
+    if task is not None:
+        HTTP_CLIENT_COLLAPSED.labels(call=key[0], reason="inflight").inc()
+    else:
+        task = _inflight[key] = asyncio.ensure_future(fetch())
+        task.add_done_callback(lambda done: _store_lookup(key, done))
+    # shield: a caller that gets cancelled must not cancel the call the others are waiting on
+    return dict(await asyncio.shield(task))
+
+def _store_lookup(key: tuple, task: asyncio.Task):
+    _inflight.pop(key, None)
+    if LOOKUP_CACHE_TTL <= 0 or task.cancelled() or task.exception() is not None:
+        return
+    _lookup_cache[key] = (time.monotonic() + LOOKUP_CACHE_TTL, task.result())
+    while len(_lookup_cache) > LOOKUP_CACHE_SIZE:
+        _lookup_cache.popitem(last=False)
 
-@retry(**RETRY_POLICY)
 async def get_user_by_id(user_id: int):
     """Get user details from user service"""
+    return await _single_flight(("user", user_id), lambda: _fetch_user(user_id))
+
+async def _fetch_user(user_id: int) -> dict:
     response = await make_service_request(
         "GET",
         USER_SERVICE_URL,
@@ -68,16 +259,24 @@ async def get_user_by_id(user_id: int):
     
     return response.json()
 
-@retry(**RETRY_POLICY)
 async def get_item_by_id(item_id: int):
     """Get item details from inventory service"""
+    return await _single_flight(("item", item_id), lambda: _fetch_item(item_id))
+
+async def _fetch_item(item_id: int) -> dict:
+    cached = _item_etags.get(item_id)
     response = await make_service_request(
         "GET",
         INVENTORY_SERVICE_URL,
-        f"/items/{item_id}"
+        f"/items/{item_id}",
+        headers={"If-None-Match": cached[0]} if cached else None
     )
     
+    if response.status_code == 304 and cached:
+        _item_etags.move_to_end(item_id)
+        return cached[1]
     if response.status_code == 404:
+        _item_etags.pop(item_id, None)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Item {item_id} not found"
@@ -88,17 +287,129 @@ async def get_item_by_id(item_id: int):
             detail=f"Inventory service returned {response.status_code}"
         )
     
-    return response.json()
+    item = response.json()
+    etag = response.headers.get("ETag")
+    if etag and ITEM_ETAG_CACHE_SIZE > 0:
+        _item_etags[item_id] = (etag, item)
+        _item_etags.move_to_end(item_id)
+        while len(_item_etags) > ITEM_ETAG_CACHE_SIZE:
+            _item_etags.popitem(last=False)
+    return item
 
 
 # Connection with inventory for checking the stock
-@retry(**RETRY_POLICY)
 async def check_item_availability(item_id: int) -> int:
     """Check available quantity of an item"""
     item = await get_item_by_id(item_id)
     return item.get("quantity", 0)
 
-@retry(**RETRY_POLICY)
+def _is_out_of_stock(detail) -> bool:
+    # Plain reservations answer "Out of Stock", keyed ones {"message": "Out of Stock", "item_ids": [...]}
+    if isinstance(detail, dict):
+        detail = detail.get("message")
+    return detail == "Out of Stock"
+
+# Retried by make_service_request: inventory dedups reservations on the Idempotency-Key
+async def reserve_inventory(item_id: int, qty: int, idempotency_key: str) -> dict:
+    """Atomically reserve stock, returns remaining quantity and unit/total price"""
+    response = await make_service_request(
+        "POST",
+        INVENTORY_SERVICE_URL,
+        f"/items/{item_id}/reserve",
+        json={"qty": qty},
+        headers={"Idempotency-Key": idempotency_key}
+    )
+
+    if response.status_code == 404:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Item {item_id} not found"
+        )
+    elif response.status_code == 400:
+        detail = response.json().get("detail")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=OUT_OF_STOCK if _is_out_of_stock(detail) else detail
+        )
+    elif response.status_code == 409:
+        # The key was used before for another request, or that reservation was already released
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=response.json().get("detail")
+        )
+    elif response.status_code != 200:
+        logger.error("Failed to reserve inventory for item %s", item_id)
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Inventory service returned {response.status_code}"
+        )
+
+    return response.json()
+
+async def reserve_inventory_batch(lines: list[dict], idempotency_key: str) -> dict:
+    """Reserve all cart lines ({"item_id", "qty"}) in one call, all or nothing"""
+    response = await make_service_request(
+        "POST",
+        INVENTORY_SERVICE_URL,
+        "/items/reserve-batch",
+        json={"lines": lines},
+        headers={"Idempotency-Key": idempotency_key}
+    )
+
+    if response.status_code in (400, 404, 409):
+        # Pass inventory's detail through, it lists the failing item ids
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=response.json().get("detail")
+        )
+    elif response.status_code != 200:
+        logger.error("Failed to reserve inventory for cart")
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Inventory service returned {response.status_code}"
+        )
+
+    return response.json()
+
+async def commit_reservation(idempotency_key: str):
+    """Make a reservation permanent once the order is stored"""
+    response = await make_service_request(
+        "POST",
+        INVENTORY_SERVICE_URL,
+        f"/items/reservations/{idempotency_key}/commit",
+        idempotent=True
+    )
+
+    if response.status_code in (404, 409):
+        # Unknown key, or the TTL sweeper released it and the stock went back on sale
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=response.json().get("detail")
+        )
+    elif response.status_code != 200:
+        logger.error("Failed to commit reservation %s", idempotency_key)
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Inventory service returned {response.status_code}"
+        )
+
+async def release_reservation(idempotency_key: str):
+    """Compensation step: give the reserved stock back"""
+    response = await make_service_request(
+        "POST",
+        INVENTORY_SERVICE_URL,
+        f"/items/reservations/{idempotency_key}/release",
+        idempotent=True
+    )
+
+    # 404: nothing was reserved under this key, so there is nothing to give back
+    if response.status_code not in (200, 404):
+        logger.error("Failed to release reservation %s", idempotency_key)
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Inventory service returned {response.status_code}"
+        )
+
 async def reduce_inventory(item_id: int, qty: int):
     """Reduce item quantity in inventory"""
     response = await make_service_request(
@@ -109,13 +420,12 @@ async def reduce_inventory(item_id: int, qty: int):
     )
 
     if response.status_code != 200:
-        logger.error(f"Failed to reduce inventory for item {item_id}")
+        logger.error("Failed to reduce inventory for item %s", item_id)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Failed to reduce inventory for item {item_id}"
         )
 
-@retry(**RETRY_POLICY)
 async def increase_inventory(item_id: int, qty: int):
     """Increase item quantity in inventory"""
     response = await make_service_request(
@@ -126,7 +436,7 @@ async def increase_inventory(item_id: int, qty: int):
     )
 
     if response.status_code != 200:
-        logger.error(f"Failed to increase inventory for item {item_id}")
+        logger.error("Failed to increase inventory for item %s", item_id)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Failed to increase inventory for item {item_id}"
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import os
+import time
+from app.utils.logger import logger
+from app.utils.metrics import (
+    STOCK_PROJECTION_EVENT_LAG, STOCK_PROJECTION_STALENESS, STOCK_PROJECTION_ITEMS, STOCK_PROJECTION_REJECTIONS
+)
+from app.utils.service_clients import make_service_request, INVENTORY_SERVICE_URL
+
+# How stock-change events from inventory_service reach us: "none" (default, projection unused),
+# "http" (inventory POSTs them to /internal/stock-events), "postgres" (LISTEN on the inventory database)
+# or "memory" (an in-process queue handed to consume_stock_events, for single-process setups)
+STOCK_PROJECTION_SOURCE = os.getenv("STOCK_PROJECTION_SOURCE", "none")
+STOCK_EVENTS_CHANNEL = os.getenv("STOCK_EVENTS_CHANNEL", "stock_events")
+# postgres source: the inventory database, same URL as inventory's INVENTORY_DATABASE_URL
+STOCK_EVENTS_DATABASE_URL = os.getenv("STOCK_EVENTS_DATABASE_URL", "")
+# Shared secret inventory sends with every batch; required by the http source
+STOCK_EVENTS_TOKEN = os.getenv("STOCK_EVENTS_TOKEN", "")
+# Entries not updated for this long are not trusted to reject orders; inventory answers instead
+STOCK_PROJECTION_MAX_AGE = float(os.getenv("STOCK_PROJECTION_MAX_AGE", 60))
+# Fill the projection from inventory's catalog on start, so quiet items are known too
+STOCK_PROJECTION_BOOTSTRAP = os.getenv("STOCK_PROJECTION_BOOTSTRAP", "true").lower() in ("1", "true", "yes")
+STOCK_PROJECTION_RECONNECT_DELAY = float(os.getenv("STOCK_PROJECTION_RECONNECT_DELAY", 2.0))
+
+class StockProjection:
+    """Read-only copy of inventory's quantity, price and version per item, kept up to date by stock events.
+    Inventory stays authoritative: the projection only turns away orders that certainly can't be
+    served and gives provisional prices. Events older than the entry's version are ignored."""
+
+    def __init__(self, max_age: float = STOCK_PROJECTION_MAX_AGE):
+        self.max_age = max_age
+        # item_id -> (quantity, price, version, updated_at)
+        self.entries: dict[int, tuple[int, float, int, float]] = {}
+        self.last_event_at = time.monotonic()
+
+    def apply(self, events: list[dict]) -> int:
+        """Apply a batch of events, returns how many changed the projection"""
+        now, wall = time.monotonic(), time.time()
+        applied = 0
+        for event in events:
+            item_id = event["item_id"]
+            if event.get("ts") is not None:
+                STOCK_PROJECTION_EVENT_LAG.observe(max(0.0, wall - event["ts"]))
+            if event.get("deleted"):
+                applied += self.entries.pop(item_id, None) is not None
+                continue
+            current = self.entries.get(item_id)
+            if current is not None and current[2] >= event["version"]:
+                continue
+            self.entries[item_id] = (event["quantity"], event["price"], event["version"], now)
+            applied += 1
+        self.last_event_at = now
+        STOCK_PROJECTION_ITEMS.set(len(self.entries))
+        return applied
+
+    def seed(self, items: list[dict]):
+        """Add catalog rows for items no event has told us about yet. Rows carry no version,
+        so they are stored as version 0 and any later event replaces them."""
+        now = time.monotonic()
+        for item in items:
+            self.entries.setdefault(item["id"], (item["quantity"], item["price"], 0, now))
+        STOCK_PROJECTION_ITEMS.set(len(self.entries))
+
+    def clear(self):
+        self.entries.clear()
+        STOCK_PROJECTION_ITEMS.set(0)
+
+    def _fresh(self, item_id: int):
+        entry = self.entries.get(item_id)
+        if entry is None or time.monotonic() - entry[3] > self.max_age:
+            return None
+        return entry
+
+    def short_items(self, lines: dict[int, int]) -> list[int]:
+        """Ids of items known to have less stock than requested; unknown items are never short"""
+        short = []
+        for item_id, qty in lines.items():
+            entry = self._fresh(item_id)
+            if entry is not None and entry[0] < qty:
+                short.append(item_id)
+        if short:
+            STOCK_PROJECTION_REJECTIONS.inc()
+        return short
+
+    def price(self, item_id: int) -> float | None:
+        entry = self.entries.get(item_id)
+        return entry[1] if entry is not None else None
+
+    def staleness(self) -> float:
+        return time.monotonic() - self.last_event_at
+
+projection = StockProjection()
+STOCK_PROJECTION_STALENESS.set_function(projection.staleness)
+
+def projection_enabled() -> bool:
+    return STOCK_PROJECTION_SOURCE != "none"
+
+def check_stock_projection_config():
+    """Called from the lifespan: refuse to start with an http source anyone could post events to.
+    A forged event with a huge version would block orders for its item until restart."""
+    if STOCK_PROJECTION_SOURCE == "http" and not STOCK_EVENTS_TOKEN:
+        raise RuntimeError("STOCK_PROJECTION_SOURCE=http requires STOCK_EVENTS_TOKEN")
+
+async def bootstrap_projection(page_size: int = 500):
+    """Seed the projection with inventory's whole catalog, page by page"""
+    cursor = None
+    while True:
+        params = {"limit": page_size}
+        if cursor:
+            params["cursor"] = cursor
+        response = await make_service_request("GET", INVENTORY_SERVICE_URL, "/items/", params=params)
+        response.raise_for_status()
+        projection.seed(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return
+
+async def consume_stock_events(queue: asyncio.Queue):
+    """Apply event batches from an in-process queue (inventory's "memory" transport)"""
+    while True:
+        events = await queue.get()
+        projection.apply(events)
+
+async def _listen_postgres():
+    import asyncpg
+    # asyncpg wants a plain postgresql:// DSN, not SQLAlchemy's driver-qualified URL
+    dsn = STOCK_EVENTS_DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
+    closed = asyncio.Event()
+    conn = await asyncpg.connect(dsn)
+    try:
+        conn.add_termination_listener(lambda _conn: closed.set())
+        await conn.add_listener(
+            STOCK_EVENTS_CHANNEL, lambda _conn, _pid, _channel, payload: projection.apply(json.loads(payload))
+        )
+        # Events published while we weren't listening are lost: start over from the catalog
+        projection.clear()
+        if STOCK_PROJECTION_BOOTSTRAP:
+            await bootstrap_projection()
+        await closed.wait()
+    finally:
+        await conn.close()
+
+async def run_stock_projection():
+    """Background task: bootstrap the projection and, for the postgres source, keep LISTENing.
+    The http and memory sources deliver events through the route / consume_stock_events instead."""
+    if not projection_enabled():
+        return
+    while True:
+        try:
+            if STOCK_PROJECTION_SOURCE == "postgres":
+                await _listen_postgres()
+            else:
+                if STOCK_PROJECTION_BOOTSTRAP:
+                    await bootstrap_projection()
+                return
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Orders still work without the projection, they just always ask inventory
+            logger.exception("Stock projection source failed")
+            projection.clear()
+        await asyncio.sleep(STOCK_PROJECTION_RECONNECT_DELAY)
@@ -0,0 +1,217 @@
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Where finished spans go: "memory" (the most recent ones, GET /debug/traces), "file" (JSON lines
+# appended to TRACE_FILE by a background thread) or "none". Context propagation works with every exporter.
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "memory")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", 5000))
+# Share of new traces that are recorded; the sampled flag of an incoming traceparent wins
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 1.0))
+SERVICE_NAME = os.getenv("SERVICE_NAME", "order_service")
+
+# W3C Trace Context: version-traceid-parentid-flags
+_TRACEPARENT = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current_span: contextvars.ContextVar["Span | None"] = contextvars.ContextVar("current_span", default=None)
+# Server-Timing of the request being served: metric -> [seconds, calls]
+_timings: contextvars.ContextVar[dict | None] = contextvars.ContextVar("server_timings", default=None)
+
+class Span:
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "sampled", "start", "duration",
+                 "attributes", "_started")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, sampled: bool,
+                 kind: str = "internal", attributes: dict | None = None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start = time.time()
+        self.duration = None
+        self.attributes = attributes or {}
+        self._started = time.perf_counter()
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._started
+
+    def end(self, duration: float | None = None):
+        self.duration = self.elapsed() if duration is None else duration
+        if self.sampled:
+            exporter.export(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "service": SERVICE_NAME, "name": self.name, "kind": self.kind, "trace_id": self.trace_id,
+            "span_id": self.span_id, "parent_id": self.parent_id, "start": self.start,
+            "duration_ms": round((self.duration or 0.0) * 1000, 3), "attributes": self.attributes,
+        }
+
+class NullExporter:
+    def export(self, span: Span):
+        pass
+
+class MemoryExporter:
+    """Keeps the last `size` spans in memory"""
+
+    def __init__(self, size: int = TRACE_BUFFER_SIZE):
+        self.spans: deque[Span] = deque(maxlen=size)
+
+    def export(self, span: Span):
+        self.spans.append(span)
+
+    def find(self, trace_id: str | None = None, limit: int = 200) -> list[dict]:
+        spans = [span for span in self.spans if trace_id is None or span.trace_id == trace_id]
+        return [span.to_dict() for span in spans[-limit:]]
+
+class FileExporter:
+    """Appends spans as JSON lines; a background thread does the writing, like the log queue"""
+
+    def __init__(self, path: str = TRACE_FILE):
+        self.path = path
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        threading.Thread(target=self._write, name="trace-exporter", daemon=True).start()
+
+    def export(self, span: Span):
+        self._queue.put(span)
+
+    def _write(self):
+        with open(self.path, "a", buffering=1) as f:
+            while True:
+                span = self._queue.get()
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+def build_exporter(name: str = TRACE_EXPORTER):
+    if name == "file":
+        return FileExporter()
+    if name == "none":
+        return NullExporter()
+    return MemoryExporter()
+
+exporter = build_exporter()
+
+def parse_traceparent(value: str | None) -> tuple[str, str, bool] | None:
+    """(trace id, parent span id, sampled) of a valid traceparent header, else None"""
+    match = _TRACEPARENT.match(value.strip().lower()) if value else None
+    if match is None or match.group(1) == "ff" or set(match.group(2)) == {"0"} or set(match.group(3)) == {"0"}:
+        return None
+    return match.group(2), match.group(3), bool(int(match.group(4), 16) & 1)
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+def _child(name: str, kind: str, attributes: dict) -> Span:
+    parent = _current_span.get()
+    if parent is None:
+        # Outside a request (background workers): start a new trace
+        return Span(name, f"{random.getrandbits(128):032x}", None, random.random() < TRACE_SAMPLE_RATE, kind, attributes)
+    return Span(name, parent.trace_id, parent.span_id, parent.sampled, kind, attributes)
+
+@contextmanager
+def start_span(name: str, kind: str = "internal", **attributes):
+    """Span around the block, current span while it runs"""
+    span = _child(name, kind, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+def record_span(name: str, duration: float, kind: str = "internal", **attributes):
+    """Span for work timed elsewhere (SQL statements), only inside a traced request"""
+    if _current_span.get() is None:
+        return
+    span = _child(name, kind, attributes)
+    span.start -= duration
+    span.end(duration)
+
+def add_timing(metric: str, seconds: float):
+    """Add to the request's Server-Timing entry `metric`"""
+    timings = _timings.get()
+    if timings is None:
+        return
+    entry = timings.get(metric)
+    if entry is None:
+        timings[metric] = [seconds, 1]
+    else:
+        entry[0] += seconds
+        entry[1] += 1
+
+def server_timing(timings: dict, total: float) -> str:
+    entries = [f'{metric};dur={seconds * 1000:.2f};desc="{calls} calls"' for metric, (seconds, calls) in sorted(timings.items())]
+    entries.append(f"app;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+class TraceContextFilter(logging.Filter):
+    """Adds trace_id/span_id of the current span to log records, so lines correlate across services"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = _current_span.get()
+        if span is not None:
+            record.trace_id = span.trace_id
+            record.span_id = span.span_id
+        return True
+
+class TracingMiddleware:
+    """Raw ASGI middleware: continues the caller's trace (traceparent header) or starts one, makes the
+    request's span current, and answers with traceresponse and Server-Timing headers
+    (time spent in the database and in each downstream service, plus the whole app)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        incoming = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                incoming = parse_traceparent(value.decode("latin-1"))
+                break
+        if incoming is None:
+            trace_id, parent_id, sampled = f"{random.getrandbits(128):032x}", None, random.random() < TRACE_SAMPLE_RATE
+        else:
+            trace_id, parent_id, sampled = incoming
+        span = Span(scope["method"], trace_id, parent_id, sampled, "server")
+        timings: dict = {}
+        span_token = _current_span.set(span)
+        timings_token = _timings.set(timings)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                span.attributes["http.status_code"] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"traceresponse", span.traceparent().encode()))
+                headers.append((b"server-timing", server_timing(timings, span.elapsed()).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_span.reset(span_token)
+            _timings.reset(timings_token)
+            # Named after the matched route template, like the request metrics
+            route = scope.get("route")
+            span.name = f"{scope['method']} {getattr(route, 'path', None) or 'unmatched'}"
+            span.attributes["http.target"] = scope["path"]
+            span.end()
@@ -0,0 +1,55 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from app.metrics.prometheus_metrics import PASSWORD_HASH_QUEUE_DEPTH, PASSWORD_HASH_REJECTED
+
+# bcrypt cost factor. Hashes made with a different cost are transparently rehashed on the next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# bcrypt releases the GIL, so a small thread pool hashes in parallel without blocking the event loop
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 2))
+# Hash/verify calls allowed to wait for a worker before we answer 503 instead of queueing forever
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 64))
+
+# CryptContext gives a simple way to hash passwords, and algorithm used is bcrypt
+# deprecated = "auto" for setting the old hashing methods as deprecated and use the new one
+# min/max rounds equal to the default make any hash with another cost factor "need update"
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_pending = 0
+
+async def _run(fn, *args):
+    global _pending
+    if _pending >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE:
+        # Shed load: a login storm should get fast 503s, not stall every request behind bcrypt
+        PASSWORD_HASH_REJECTED.inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts in progress, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    _pending += 1
+    PASSWORD_HASH_QUEUE_DEPTH.set(_pending)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        _pending -= 1
+        PASSWORD_HASH_QUEUE_DEPTH.set(_pending)
+
+async def hash_password(password: str) -> str:
+    return await _run(pwd_context.hash, password)
+
+async def verify_password(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """Returns (valid, new_hash). new_hash is set when the stored hash should be replaced."""
+    return await _run(pwd_context.verify_and_update, password, hashed_password)
+
+def shutdown_hash_pool():
+    _executor.shutdown(wait=False, cancel_futures=True)
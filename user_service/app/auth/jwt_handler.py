@@ -4,7 +4,10 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from app.db.database import get_db
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.crud.user import get_user_by_email
+from app.crud.user import get_user_by_email, get_a_user
+from app.auth.token_cache import decode_token
+from app.auth.principal_cache import principal_cache
+from app.schemas.user import UserOut, TokenPrincipal
 import os
 from dotenv import load_dotenv
 
@@ -16,27 +19,52 @@ print(OAuth2PasswordBearer.__module__)
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+# When true, read-only endpoints authorise from the JWT claims alone and never read the users table
+AUTH_TRUST_CLAIMS = os.getenv("AUTH_TRUST_CLAIMS", "false").lower() in ("1", "true", "yes")
 
 oauth2_scheme = OAuth2PasswordBearer("/users/login")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _decode_claims(token: str) -> dict:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        role: str = payload.get("role")  # Extract role
-        if email is None or role is None:
-            raise credentials_exception
+        payload = decode_token(token, SECRET_KEY, ALGORITHM)
     except JWTError:
-        raise credentials_exception 
-    user = await get_user_by_email(db, email=email)
+        raise _credentials_exception()
+    if payload.get("sub") is None or payload.get("role") is None:
+        raise _credentials_exception()
+    return payload
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    """Returns the caller's profile, read from the users table at most once per USER_CACHE_TTL"""
+    payload = _decode_claims(token)
+    user_id = payload.get("user_id")
+    if user_id is not None:
+        cached = principal_cache.get(user_id)
+        if cached is not None:
+            return cached
+        user = await get_a_user(db, user_id)
+    else:
+        # Tokens issued before user_id was added to the claims
+        user = await get_user_by_email(db, email=payload["sub"])
     if user is None:
-        raise credentials_exception
-    return user
+        raise _credentials_exception()
+    principal = UserOut.model_validate(user, from_attributes=True)
+    principal_cache.put(user.id, principal)
+    return principal
+
+async def get_current_principal(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    """For read-only endpoints that only need the caller's id/role.
+    With AUTH_TRUST_CLAIMS the signed claims are enough, otherwise same as get_current_user."""
+    if not AUTH_TRUST_CLAIMS:
+        return await get_current_user(token, db)
+    payload = _decode_claims(token)
+    return TokenPrincipal(id=payload.get("user_id"), email=payload["sub"], role=payload["role"])
 
 def create_access_token(data: dict):
     to_encode = data.copy()
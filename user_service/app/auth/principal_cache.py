@@ -0,0 +1,52 @@
+import os
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from app.models.user import User
+from app.schemas.user import UserOut
+
+# How long an authenticated user's profile is reused before it is read from the users table again
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 30))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+
+class PrincipalCache:
+    """Short-lived LRU of authenticated users, keyed by user id"""
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[int, tuple[float, UserOut]] = OrderedDict()
+
+    def get(self, user_id: int) -> UserOut | None:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return user
+
+    def put(self, user_id: int, user: UserOut):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        self._entries[user_id] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+principal_cache = PrincipalCache()
+
+def invalidate_user(user_id: int):
+    """Drop a user from the cache, call this after changing a users row outside the ORM"""
+    principal_cache.invalidate(user_id)
+
+# Any ORM flush that updates or deletes a user invalidates its cached principal
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_on_change(mapper, connection, target: User):
+    invalidate_user(target.id)
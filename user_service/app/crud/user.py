@@ -2,18 +2,16 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.models.user import User
 from app.schemas.user import UserCreate
-from passlib.context import CryptContext
 # This is part of user authentication system, this is for securely storing passwords in database
-# CryptContext gives a simple way to hashpasswords, and algorithm used is bcrypt
-# deprecated = "auto" for setting the old hashing methods as deprecated and use the new one
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashing runs on a worker pool (app/auth/hashing.py), bcrypt would otherwise block the event loop
+from app.auth.hashing import hash_password, verify_password
 
 async def get_user_by_email(db: AsyncSession, email:str):
     result = await db.execute(select(User).where(User.email == email))
     return result.scalar_one_or_none()
 
 async def create_user(db: AsyncSession, user: UserCreate):
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = await hash_password(user.password)
     new_user = User(
         username = user.username,
         email = user.email,
@@ -27,9 +25,16 @@ async def create_user(db: AsyncSession, user: UserCreate):
 
 async def verify_user(db: AsyncSession, email: str, password: str):
     user = await get_user_by_email(db, email)
-    if user and pwd_context.verify(password, user.hashed_password):
-        return user
-    return None
+    if not user:
+        return None
+    valid, new_hash = await verify_password(password, user.hashed_password)
+    if not valid:
+        return None
+    if new_hash:
+        # Cost factor changed since this hash was made, upgrade it while we know the password
+        user.hashed_password = new_hash
+        await db.commit()
+    return user
 
 async def get_users(db: AsyncSession):
     result = await db.execute(select(User))
@@ -1,14 +1,15 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import declarative_base, sessionmaker
 import os
 from dotenv import load_dotenv
+from app.db.engine import create_engine
 
 load_dotenv()  # loading variables from .env
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-# Create asynchronous engine to connect to PostgreSQL database asynchronously
-engine = create_async_engine(DATABASE_URL, echo=True)
+# Create asynchronous engine to connect to PostgreSQL database asynchronously (pool settings from DB_* env vars)
+engine = create_engine(DATABASE_URL)
 
 # Session factory using async session to interact with the database in routes and CRUD operations
 AsyncSessionLocal = sessionmaker(
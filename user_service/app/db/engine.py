@@ -0,0 +1,52 @@
+import os
+import time
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.db.instrumentation import instrument_engine
+from app.metrics.prometheus_metrics import DB_POOL_CHECKOUT_WAIT, DB_POOL_WAITING, DB_POOL_CHECKED_OUT, DB_POOL_CAPACITY
+
+# Engine settings, the same variables in every service
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 5))         # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))        # reconnect connections older than this
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 500))  # asyncpg prepared statements per connection
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that reports how long (and how many) requests wait for a connection"""
+
+    def _do_get(self):
+        DB_POOL_WAITING.inc()
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAITING.dec()
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+def create_engine(url: str) -> AsyncEngine:
+    """Async engine configured from the DB_* environment variables"""
+    kwargs = {"echo": DB_ECHO}
+    # SQLite (local runs, tests) has no server connections worth pooling or sizing
+    if not url.startswith("sqlite"):
+        kwargs.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+            poolclass=InstrumentedPool,
+        )
+    if "+asyncpg" in url:
+        kwargs["connect_args"] = {"statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+
+    engine = create_async_engine(url, **kwargs)
+    # Per-statement metrics and slow-query logging (app/db/instrumentation.py)
+    instrument_engine(engine)
+    pool = engine.sync_engine.pool
+    if isinstance(pool, InstrumentedPool):
+        DB_POOL_CHECKED_OUT.set_function(pool.checkedout)
+        DB_POOL_CAPACITY.set(DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    return engine
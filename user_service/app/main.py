@@ -1,8 +1,26 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.routers import user
+from app.routers import user, debug
 from app.metrics import prometheus_metrics
+from app.auth.hashing import shutdown_hash_pool
+from app.db.instrumentation import SQLStatsMiddleware
+from app.utils.profiler import track_task_ages
+from app.utils.tracing import TracingMiddleware
 
-app = FastAPI(title= "User Service")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Creation times of tasks, for the ages in /debug/tasks
+    track_task_ages()
+    yield
+    shutdown_hash_pool()
+
+app = FastAPI(title= "User Service", lifespan=lifespan)
 
 app.include_router(user.router)
-app.include_router(prometheus_metrics.router)
\ No newline at end of file
+app.include_router(prometheus_metrics.router)
+app.include_router(debug.router)
+
+# Counts SQL statements per request (db_statements_per_request)
+app.add_middleware(SQLStatsMiddleware)
+# Outermost, so its span and Server-Timing cover the other middleware too
+app.add_middleware(TracingMiddleware)
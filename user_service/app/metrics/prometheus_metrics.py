@@ -1,5 +1,5 @@
 # prometheus_client is official python library for exporting metrics to prometheus
-from prometheus_client import Counter, generate_latest
+from prometheus_client import Counter, Gauge, Histogram, generate_latest
 from fastapi import APIRouter, Response
 
 router = APIRouter() # this new route can be included in our mainapp 
@@ -8,6 +8,37 @@ router = APIRouter() # this new route can be included in our mainapp
 # "Total users created" its the help string, shown in Prometheus dashboards and docs
 user_created_counter = Counter("user_created_total", "Total users created")
 
+# Decoded-JWT cache in app/auth/token_cache.py
+TOKEN_CACHE_HITS = Counter("auth_token_cache_hits_total", "Bearer tokens served from the decoded-claims cache")
+TOKEN_CACHE_MISSES = Counter("auth_token_cache_misses_total", "Bearer tokens that had to be verified and decoded")
+
+# bcrypt worker pool in app/auth/hashing.py
+PASSWORD_HASH_QUEUE_DEPTH = Gauge("password_hash_queue_depth", "Hash/verify calls running or waiting for a bcrypt worker")
+PASSWORD_HASH_REJECTED = Counter("password_hash_rejected_total", "Hash/verify calls shed with 503 because the queue was full")
+
+# Database connection pool in app/db/engine.py
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a pooled database connection",
+    buckets=[0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0]
+)
+DB_POOL_WAITING = Gauge("db_pool_checkouts_waiting", "Requests currently waiting for a database connection")
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out_connections", "Database connections currently in use")
+DB_POOL_CAPACITY = Gauge("db_pool_max_connections", "Configured pool_size + max_overflow")
+
+# SQL statements in app/db/instrumentation.py, labelled by statement template id (see /debug/sql-stats)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "Latency of SQL statements by template", ["statement"],
+    buckets=[0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0]
+)
+DB_QUERY_ROWS = Histogram(
+    "db_query_rows", "Rows returned or affected by SQL statements by template", ["statement"],
+    buckets=[0, 1, 5, 10, 50, 100, 500, 1000, 5000]
+)
+DB_STATEMENTS_PER_REQUEST = Histogram(
+    "db_statements_per_request", "SQL statements run while serving one HTTP request", ["path"],
+    buckets=[0, 1, 2, 3, 5, 10, 20, 50, 100]
+)
+
 @router.get("/metrics")
 async def metrics():
     # generate_latest() returns all metrics our service has collected(as raw Prometheus data)
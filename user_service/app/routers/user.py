@@ -4,8 +4,9 @@ from app.db.database import get_db
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.crud import user as crud_user
 from app.utils.logger import logger
+from app.utils.fast_json import json_rows_response
 from fastapi.security import OAuth2PasswordRequestForm
-from app.auth.jwt_handler import get_current_user, create_access_token
+from app.auth.jwt_handler import get_current_user, get_current_principal, create_access_token
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -28,18 +29,19 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     new_user = await crud_user.create_user(db, user)
-    logger.info(f"User created: {new_user.email}")
+    logger.info("User created: %s", new_user.email)
     return new_user
 
 @router.get("/",response_model=list[UserOut])
-async def read_users(db: AsyncSession = Depends(get_db), user = Depends(get_current_user)):
+async def read_users(db: AsyncSession = Depends(get_db), user = Depends(get_current_principal)):
     if user.role == "user":
         raise HTTPException(status_code=401, detail="Unauthorized")
-    return await crud_user.get_users(db)
+    users = await crud_user.get_users(db)
+    return json_rows_response(users, UserOut) or users
 
 
 @router.get("/{user_id}", response_model=UserOut)
-async def read_a_user(user_id: int, db: AsyncSession = Depends(get_db), user = Depends(get_current_user)):
+async def read_a_user(user_id: int, db: AsyncSession = Depends(get_db), user = Depends(get_current_principal)):
     if user.role == "user":
         raise HTTPException(status_code=401, detail="Unauthorized")
     return await crud_user.get_a_user(db, user_id)
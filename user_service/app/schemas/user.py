@@ -21,4 +21,10 @@ class UserOut(UserBase):
     created_at: datetime
     
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class TokenPrincipal(BaseModel):
+    # Caller identity built from JWT claims alone, without reading the users table
+    id: int | None = None
+    email: str
+    role: str
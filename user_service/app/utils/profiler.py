@@ -0,0 +1,108 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import weakref
+from collections import Counter
+
+# Sampling period of /debug/profile and the longest profile one request may ask for
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", 10))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", 60))
+PROFILE_MAX_DEPTH = 128
+
+# One profile at a time, a second one would only double the overhead
+_profiling = threading.Lock()
+# Creation time of tasks started after track_task_ages()
+_task_created: "weakref.WeakKeyDictionary[asyncio.Task, float]" = weakref.WeakKeyDictionary()
+
+class ProfilerBusy(Exception):
+    pass
+
+def _frame_label(frame, current_line: bool = False) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    # Profiles use the def line, not the current line, so one function stays one box in the flamegraph
+    line = frame.f_lineno if current_line else code.co_firstlineno
+    return f"{name} ({os.path.basename(code.co_filename)}:{line})"
+
+def _stack(frame) -> list[str]:
+    labels = []
+    while frame is not None and len(labels) < PROFILE_MAX_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+def sample_stacks(seconds: float, interval: float) -> Counter:
+    """Sample every thread's stack (the event loop thread shows the coroutine running right now)
+    every `interval` seconds, for `seconds`. Returns collapsed stacks -> sample count.
+    Blocking: run it in a worker thread."""
+    if not _profiling.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        me = threading.get_ident()
+        samples: Counter = Counter()
+        deadline = time.monotonic() + seconds
+        next_at = time.monotonic()
+        while next_at < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = [names.get(ident, f"thread-{ident}")] + _stack(frame)
+                samples[";".join(label.replace(";", ",") for label in stack)] += 1
+            # Fixed rate: a slow sample shortens the next sleep instead of shifting the schedule
+            next_at += interval
+            time.sleep(max(0.0, next_at - time.monotonic()))
+        return samples
+    finally:
+        _profiling.release()
+
+async def profile(seconds: float, interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS) -> str:
+    """Collapsed-stack text (one "frame;frame;... count" line per stack), as read by
+    flamegraph.pl or speedscope"""
+    seconds = min(max(seconds, 0.1), PROFILE_MAX_SECONDS)
+    samples = await asyncio.to_thread(sample_stacks, seconds, max(interval_ms, 1.0) / 1000)
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+def _task_factory(loop, coro, **kwargs):
+    task = asyncio.Task(coro, loop=loop, **kwargs)
+    _task_created[task] = time.monotonic()
+    return task
+
+def track_task_ages():
+    """Record when tasks are created, for the ages in /debug/tasks. Call once from the lifespan."""
+    loop = asyncio.get_running_loop()
+    if loop.get_task_factory() is None:
+        loop.set_task_factory(_task_factory)
+
+def _await_stack(coro, limit: int) -> list[str]:
+    """Where a suspended task waits: its coroutine and everything it is awaiting, outermost first.
+    (Task.get_stack only returns the outermost frame of a suspended coroutine.)"""
+    labels = []
+    while coro is not None and len(labels) < limit:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            # A future or other awaitable at the bottom of the chain
+            labels.append(f"<{type(coro).__name__}>")
+            break
+        labels.append(_frame_label(frame, current_line=True))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return labels
+
+def list_tasks(stack_limit: int = 20) -> list[dict]:
+    """Pending asyncio tasks, oldest first; age is None for tasks created before tracking started"""
+    now = time.monotonic()
+    tasks = []
+    for task in asyncio.all_tasks():
+        created = _task_created.get(task)
+        coro = task.get_coro()
+        tasks.append({
+            "name": task.get_name(),
+            "coroutine": getattr(coro, "__qualname__", repr(coro)),
+            "age_seconds": round(now - created, 3) if created is not None else None,
+            "stack": _await_stack(coro, stack_limit),
+        })
+    tasks.sort(key=lambda task: (task["age_seconds"] is not None, -(task["age_seconds"] or 0)))
+    return tasks